@@ -0,0 +1,195 @@
+"""
+Compare payment success throughput under WSGI and ASGI with a slow Stripe.
+
+    python -m benchmarks.asgi_wsgi --requests 400 --concurrency 100 \\
+        --threads 8 --stripe-latency-ms 200
+
+Every request confirms a different paid checkout session. `wsgi` serves
+them through Django's WSGI handler from `--threads` threads, like one
+gthread worker; `asgi` serves them through the ASGI handler on one event
+loop with up to `--concurrency` requests in flight, like one Uvicorn
+worker. The async view awaits Stripe there, so no thread waits on it.
+On SQLite the single writer still queues the payment updates; run it
+against PostgreSQL for production numbers.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from benchmarks.common import (
+    benchmark_database,
+    offline_services,
+    setup_django,
+    summarize,
+    write_results,
+)
+
+
+def seed(count: int) -> list[str]:
+    """Pending payments whose Stripe sessions are already paid."""
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+    from payment.gateway import get_gateway
+    from payment.models import Payment
+    from payment.stripe_payment import create_payment_session
+
+    user = get_user_model().objects.create_user(email="bench@bench.com")
+    book = Book.objects.create(
+        title="Bench book",
+        author="Bench Author",
+        cover=Book.CoverType.SOFT,
+        inventory=count,
+        daily_fee=1,
+    )
+    borrowing = Borrowing.objects.create(
+        expected_return_date=timezone.now().date() + timedelta(days=7),
+        book=book,
+        user=user,
+    )
+    payments = Payment.objects.bulk_create(
+        Payment(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing=borrowing,
+            money_to_pay=1,
+        )
+        for _ in range(count)
+    )
+    gateway = get_gateway()
+    latency, gateway.latency = gateway.latency, 0
+    session_ids = []
+    for payment in payments:
+        session_id = create_payment_session(payment).session_id
+        gateway.complete(session_id)
+        session_ids.append(session_id)
+    gateway.latency = latency
+    return session_ids
+
+
+def run_wsgi(session_ids: list[str], threads: int) -> tuple[list, float]:
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+
+    url = reverse("payments:payment-success")
+
+    def request(session_id):
+        started = time.perf_counter()
+        response = Client().get(url, {"session_id": session_id})
+        assert response.status_code == 200, response.status_code
+        return (time.perf_counter() - started) * 1000
+
+    def worker(session_ids):
+        try:
+            return [request(session_id) for session_id in session_ids]
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        chunks = executor.map(
+            worker, [session_ids[number::threads] for number in range(threads)]
+        )
+        timings = [timing for chunk in chunks for timing in chunk]
+    return timings, time.perf_counter() - started
+
+
+def run_asgi(session_ids: list[str], concurrency: int) -> tuple[list, float]:
+    from asgiref.sync import ThreadSensitiveContext
+    from django.test import AsyncClient
+    from django.urls import reverse
+
+    url = reverse("payments:payment-success")
+
+    async def request(session_id, slots):
+        async with slots:
+            started = time.perf_counter()
+            # As in ASGIHandler: each request gets its own sync thread
+            async with ThreadSensitiveContext():
+                response = await AsyncClient().get(url, {"session_id": session_id})
+            assert response.status_code == 200, response.status_code
+            return (time.perf_counter() - started) * 1000
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(
+            *(request(session_id, slots) for session_id in session_ids)
+        )
+
+    started = time.perf_counter()
+    timings = asyncio.run(main())
+    return timings, time.perf_counter() - started
+
+
+def run(requests: int, concurrency: int, threads: int) -> list:
+    from unittest import mock
+    from payment.models import Payment
+    from payment.views import PaymentSuccessView
+
+    from django.db import connection
+
+    if connection.vendor == "sqlite":
+        # SQLite has a single writer: let the in-flight requests queue for
+        # it instead of failing with "database is locked" after 5s
+        connection.settings_dict["OPTIONS"]["timeout"] = 60
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode=WAL")
+    sessions = seed(requests * 2)
+    results = []
+    for name, serve, workers, session_ids in (
+            ("wsgi", run_wsgi, threads, sessions[:requests]),
+            ("asgi", run_asgi, concurrency, sessions[requests:]),
+    ):
+        # Only the request path is measured, the outbox is left undelivered
+        with mock.patch.object(
+                PaymentSuccessView, "throttle_classes", []
+        ), mock.patch("tg_notifications.tasks.dispatch_outbox.delay"):
+            timings, elapsed = serve(session_ids, workers)
+        paid = Payment.objects.filter(
+            session_id__in=session_ids, status=Payment.Status.PAID
+        ).count()
+        results.append({
+            "server": name,
+            "workers": workers,
+            "requests": requests,
+            "paid": paid,
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_sec": round(requests / elapsed, 1),
+            **summarize(timings),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--stripe-latency-ms", type=int, default=200)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with tempfile.TemporaryDirectory() as directory:
+        with benchmark_database(os.path.join(directory, "asgi.sqlite3")), \
+                offline_services(stripe_latency_ms=args.stripe_latency_ms):
+            results = run(args.requests, args.concurrency, args.threads)
+
+    for row in results:
+        print(
+            f"{row['server']:>4} ({row['workers']} in flight): "
+            f"{row['requests_per_sec']} req/s, "
+            f"p50={row['p50_ms']:.1f}ms p99={row['p99_ms']:.1f}ms, "
+            f"{row['paid']}/{row['requests']} paid"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
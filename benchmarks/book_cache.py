@@ -0,0 +1,79 @@
+"""
+Compare the book list with a cold and a warm catalog cache.
+
+    python -m benchmarks.book_cache --books 10000 --repeat 2000
+
+"cold" bumps the catalog version before every request, so each one runs
+the queries and serializes the page; "warm" is served from the cache.
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+
+def run(books: int, repeat: int) -> list:
+    from unittest import mock
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from book.cache import bump_version
+    from book.models import Book
+    from book.views import BookViewSet
+
+    Book.objects.bulk_create(
+        (
+            Book(
+                title=f"Book {number}",
+                author="Bench Author",
+                cover=Book.CoverType.SOFT,
+                inventory=1,
+                daily_fee=1,
+            )
+            for number in range(books)
+        ),
+        batch_size=5000,
+    )
+    client = APIClient()
+    url = reverse("books:book-list")
+
+    def cold():
+        bump_version()
+        client.get(url, {"limit": 100})
+
+    def warm():
+        client.get(url, {"limit": 100})
+
+    results = []
+    with mock.patch.object(BookViewSet, "throttle_classes", []):
+        for name, request in (("cold", cold), ("warm", warm)):
+            timed(request, 50)
+            results.append({"cache": name, **summarize(timed(request, repeat))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.books, args.repeat)
+
+    for row in results:
+        print(
+            f"{row['cache']:>4}: mean={row['mean_ms']:.3f}ms "
+            f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare the full-text book search with `icontains` scans.
+
+    python -m benchmarks.book_search --books 1000000 --output search.json
+"""
+import argparse
+import random
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "sen", "tor", "vel", "dun", "ar", "is"]
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed(books: int, rng: random.Random, batch_size: int = 10_000):
+    from book.models import Book
+
+    vocabulary = make_vocabulary(5_000, rng)
+    for start in range(0, books, batch_size):
+        Book.objects.bulk_create(
+            Book(
+                title=" ".join(rng.choices(vocabulary, k=3)).capitalize(),
+                author=" ".join(rng.choices(vocabulary, k=2)).title(),
+                cover=rng.choice(Book.CoverType.values),
+                inventory=rng.randint(0, 20),
+                daily_fee=rng.randint(10, 300) / 100,
+            )
+            for _ in range(min(batch_size, books - start))
+        )
+    return vocabulary
+
+
+def run(vocabulary: list[str], limit: int, repeat: int, rng: random.Random):
+    from django.db.models import Q
+    from book.models import Book
+    from book.search import search_books
+
+    results = []
+    for term in rng.sample(vocabulary, 3):
+        def full_text():
+            list(search_books(Book.objects.all(), term)[:limit])
+
+        def icontains():
+            list(
+                Book.objects.filter(
+                    Q(title__icontains=term) | Q(author__icontains=term)
+                ).order_by("id")[:limit]
+            )
+
+        for name, func in (("full_text", full_text), ("icontains", icontains)):
+            results.append(
+                {"search": name, "term": term, **summarize(timed(func, repeat))}
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    setup_django()
+    with benchmark_database():
+        vocabulary = seed(args.books, rng)
+        results = run(vocabulary, args.limit, args.repeat, rng)
+
+    for row in results:
+        print(
+            f"{row['search']:>9} term={row['term']:<12} "
+            f"p50={row['p50_ms']:.3f}ms p95={row['p95_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
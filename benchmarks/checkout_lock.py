@@ -0,0 +1,131 @@
+"""
+Measure how long a checkout holds the book's row lock with a slow Stripe.
+
+    python -m benchmarks.checkout_lock --checkouts 20 --stripe-latency-ms 500
+
+`inline` replays the old flow, where the Stripe session was created
+inside the request transaction. `after_commit` is the current flow,
+where it is opened by `open_checkout_session` once the borrowing and its
+PENDING payment are committed. The lock is held from the book's
+inventory UPDATE until commit. Celery runs eagerly here, so request
+latency still includes Stripe in both modes; with a worker it does not.
+"""
+import argparse
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest import mock
+
+from benchmarks.common import (
+    benchmark_database,
+    offline_services,
+    setup_django,
+    summarize,
+    write_results,
+)
+
+
+@contextmanager
+def lock_timer(holds: list):
+    """Time from the inventory UPDATE to the commit that releases it."""
+    from django.db import connection, transaction
+
+    # Bound before `inline` patches the module attribute
+    on_commit = transaction.on_commit
+
+    def wrapper(execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.startswith('UPDATE "book_book"'):
+            locked_at = time.perf_counter()
+            on_commit(
+                lambda: holds.append((time.perf_counter() - locked_at) * 1000)
+            )
+        return result
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+def seed(checkouts: int):
+    from django.contrib.auth import get_user_model
+    from book.models import Book
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(email=f"user{number}@bench.com", password="!")
+        for number in range(checkouts * 2)
+    )
+    book = Book.objects.create(
+        title="Hot book",
+        author="Bench Author",
+        cover=Book.CoverType.HARD,
+        inventory=checkouts * 2,
+        daily_fee=1,
+    )
+    return book.id, list(User.objects.order_by("id"))
+
+
+def run_mode(mode: str, book_id: int, users: list) -> dict:
+    from django.urls import reverse
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+
+    payload = {
+        "book": book_id,
+        "expected_return_date": timezone.now().date() + timedelta(days=7),
+    }
+    holds, requests = [], []
+    client = APIClient()
+    # Running the on_commit callback on the spot reproduces the old,
+    # in-transaction Stripe call without keeping a copy of that code
+    inline = mock.patch(
+        "payment.stripe_payment.transaction.on_commit",
+        lambda func, robust=False: func(),
+    )
+    with lock_timer(holds):
+        if mode == "inline":
+            inline.start()
+        try:
+            for user in users:
+                client.force_authenticate(user)
+                started = time.perf_counter()
+                response = client.post(reverse("borrowings:borrowing-list"), payload)
+                requests.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 201:
+                    raise SystemExit(f"Checkout failed: {response.data}")
+        finally:
+            if mode == "inline":
+                inline.stop()
+    return {
+        "mode": mode,
+        "lock_hold": summarize(holds),
+        "request": summarize(requests),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--checkouts", type=int, default=20)
+    parser.add_argument("--stripe-latency-ms", type=int, default=500)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(), offline_services(args.stripe_latency_ms):
+        book_id, users = seed(args.checkouts)
+        results = [
+            run_mode("inline", book_id, users[:args.checkouts]),
+            run_mode("after_commit", book_id, users[args.checkouts:]),
+        ]
+
+    for row in results:
+        print(
+            f"{row['mode']:>12}: lock p50={row['lock_hold']['p50_ms']:.3f}ms "
+            f"p95={row['lock_hold']['p95_ms']:.3f}ms, "
+            f"request p50={row['request']['p50_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import json
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
+    os.environ.setdefault("DJANGO_SECRET_KEY", "benchmark")
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(sqlite_file=None):
+    """
+    Create a throwaway test database for the configured backend and drop
+    it afterwards, so benchmarks never touch the development data.
+    Pass `sqlite_file` when several threads need to share the SQLite DB.
+    """
+    from django.db import connection
+    from django.test.utils import (
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    setup_test_environment()
+    if sqlite_file and connection.vendor == "sqlite":
+        connection.settings_dict["TEST"]["NAME"] = sqlite_file
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def offline_services(stripe_latency_ms: int = 0, telegram_latency_ms: int = 0):
+    """
+    Swap Stripe and Telegram for the local stand-ins, with the given
+    latency, and run Celery tasks inline, so benchmarks that commit real
+    transactions need neither a broker nor the network.
+    """
+    from django.test.utils import override_settings
+    from library_service.celery import app
+
+    always_eager = app.conf.task_always_eager
+    app.conf.task_always_eager = True
+    try:
+        with override_settings(
+                STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway",
+                STRIPE_FAKE_LATENCY_MS=stripe_latency_ms,
+                TELEGRAM_BACKEND="tg_notifications.fake.send_message",
+                TELEGRAM_FAKE_LATENCY_MS=telegram_latency_ms,
+        ):
+            yield
+    finally:
+        app.conf.task_always_eager = always_eager
+
+
+class BackgroundWorkers:
+    """
+    Run `.delay()`ed Celery tasks on a thread pool instead of inline,
+    standing in for worker processes: request timings then exclude task
+    work, as they do in production. Use inside `offline_services()`.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _run(task, args, kwargs):
+        from django.db import connection
+
+        try:
+            task.apply(args, kwargs)
+        finally:
+            connection.close()
+
+    def submit(self, task, args, kwargs):
+        with self.lock:
+            self.futures.append(
+                self.executor.submit(self._run, task, args, kwargs)
+            )
+
+    def drain(self):
+        """Wait until every queued task, and those it queued, finished."""
+        while True:
+            with self.lock:
+                futures, self.futures = self.futures, []
+            if not futures:
+                return
+            wait(futures)
+
+    @contextmanager
+    def running(self):
+        from unittest import mock
+        from celery.app.task import Task
+
+        workers = self
+
+        def delay(task, *args, **kwargs):
+            workers.submit(task, args, kwargs)
+
+        with mock.patch.object(Task, "delay", delay):
+            try:
+                yield self
+            finally:
+                self.drain()
+                self.executor.shutdown()
+
+
+def timed(func, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def percentile(timings: list[float], pct: float) -> float:
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings: list[float]) -> dict:
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+    }
+
+
+def write_results(path, results):
+    if path:
+        with open(path, "w") as output:
+            json.dump(results, output, indent=2, default=str)
@@ -0,0 +1,100 @@
+"""
+Compare a full borrowing list response with a conditional 304.
+
+    python -m benchmarks.conditional_get --borrowings 100 --repeat 1000
+
+One user with `--borrowings` loans, two payments each, pages through
+`limit=100`: "full" sends no validator, "not_modified" replays the ETag.
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+
+def run(borrowings: int, repeat: int) -> list:
+    from datetime import timedelta
+    from unittest import mock
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from book.models import Book
+    from borrowing.models import Borrowing
+    from borrowing.views import BorrowingViewSet
+    from payment.models import Payment
+
+    user = get_user_model().objects.create_user(email="bench@bench.com")
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Book {number}",
+            author="Bench Author",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=1,
+        )
+        for number in range(borrowings)
+    )
+    loans = Borrowing.objects.bulk_create(
+        Borrowing(
+            expected_return_date=timezone.now().date() + timedelta(days=7),
+            book=book,
+            user=user,
+        )
+        for book in books
+    )
+    Payment.objects.bulk_create(
+        Payment(
+            status=Payment.Status.PAID,
+            type=payment_type,
+            borrowing=loan,
+            money_to_pay=1,
+        )
+        for loan in loans
+        for payment_type in Payment.Type.values
+    )
+    client = APIClient()
+    client.force_authenticate(user)
+    url = reverse("borrowings:borrowing-list")
+    etag = client.get(url, {"limit": 100})["ETag"]
+
+    def full():
+        client.get(url, {"limit": 100})
+
+    def not_modified():
+        client.get(url, {"limit": 100}, HTTP_IF_NONE_MATCH=etag)
+
+    results = []
+    with mock.patch.object(BorrowingViewSet, "throttle_classes", []):
+        for name, request in (("full", full), ("not_modified", not_modified)):
+            timed(request, 50)
+            results.append({"response": name, **summarize(timed(request, repeat))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--borrowings", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.borrowings, args.repeat)
+
+    for row in results:
+        print(
+            f"{row['response']:>12}: mean={row['mean_ms']:.3f}ms "
+            f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Hammer one hot book with concurrent checkouts and check for oversell.
+
+    python -m benchmarks.inventory --threads 16 --inventory 500 --attempts 1500
+
+Every attempt is made by a different user, as the API would see it.
+The run fails loudly if more borrowings succeed than there were copies.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from benchmarks.common import benchmark_database, setup_django, write_results
+
+
+def seed(inventory: int, attempts: int):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from book.models import Book
+
+    password = make_password("bench_psw")
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(email=f"user{number}@bench.com", password=password)
+        for number in range(attempts)
+    )
+    book = Book.objects.create(
+        title="Hot book",
+        author="Bench Author",
+        cover=Book.CoverType.HARD,
+        inventory=inventory,
+        daily_fee=1,
+    )
+    return book.id, list(User.objects.values_list("id", flat=True))
+
+
+def checkout_worker(book_id, user_ids, outcome, lock, max_retries=50):
+    from django.db import OperationalError, connection
+    from django.utils import timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+
+    return_date = timezone.now().date() + timedelta(days=7)
+    succeeded = sold_out = retries = 0
+    try:
+        for user_id in user_ids:
+            for _ in range(max_retries):
+                try:
+                    Borrowing.objects.create(
+                        expected_return_date=return_date,
+                        book=Book.objects.get(id=book_id),
+                        user_id=user_id,
+                    )
+                    succeeded += 1
+                except ValueError:
+                    sold_out += 1
+                except OperationalError:
+                    # SQLite allows a single writer and reports contention
+                    # as "database is locked" instead of waiting on a row
+                    retries += 1
+                    continue
+                break
+    finally:
+        connection.close()
+    with lock:
+        outcome["succeeded"] += succeeded
+        outcome["sold_out"] += sold_out
+        outcome["retries"] += retries
+
+
+def run(threads: int, inventory: int, attempts: int) -> dict:
+    from book.models import Book
+    from borrowing.models import Borrowing
+
+    book_id, user_ids = seed(inventory, attempts)
+    outcome = {"succeeded": 0, "sold_out": 0, "retries": 0}
+    lock = threading.Lock()
+    workers = [
+        threading.Thread(
+            target=checkout_worker,
+            args=(book_id, user_ids[number::threads], outcome, lock),
+        )
+        for number in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    final_inventory = Book.objects.get(id=book_id).inventory
+    borrowings = Borrowing.objects.filter(book_id=book_id).count()
+    oversold = borrowings > inventory or borrowings != outcome["succeeded"]
+    return {
+        "threads": threads,
+        "inventory": inventory,
+        "attempts": attempts,
+        **outcome,
+        "borrowings": borrowings,
+        "final_inventory": final_inventory,
+        "oversold": oversold,
+        "elapsed_s": round(elapsed, 3),
+        "checkouts_per_sec": round(outcome["succeeded"] / elapsed, 1),
+        "attempts_per_sec": round(attempts / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--inventory", type=int, default=500)
+    parser.add_argument("--attempts", type=int, default=1500)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with tempfile.TemporaryDirectory() as directory:
+        with benchmark_database(os.path.join(directory, "bench.sqlite3")):
+            result = run(args.threads, args.inventory, args.attempts)
+
+    for key, value in result.items():
+        print(f"{key:>18}: {value}")
+    write_results(args.output, result)
+    if result["oversold"] or result["final_inventory"] != max(
+            args.inventory - result["succeeded"], 0
+    ):
+        raise SystemExit("Inventory oversold or lost updates detected")
+
+
+if __name__ == "__main__":
+    main()
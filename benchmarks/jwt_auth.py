@@ -0,0 +1,99 @@
+"""
+Compare simplejwt's JWTAuthentication with ClaimsJWTAuthentication.
+
+    python -m benchmarks.jwt_auth --repeat 2000
+
+Times an authenticated borrowing list request (Bearer token, one loan)
+under each authentication class and counts its queries.
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+
+def run(repeat: int) -> list:
+    from datetime import timedelta
+    from unittest import mock
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from django.utils import timezone
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from book.models import Book
+    from borrowing.models import Borrowing
+    from borrowing.views import BorrowingViewSet
+    from user.authentication import ClaimsJWTAuthentication
+    from user.serializers import TokenClaimsSerializer
+
+    user = get_user_model().objects.create_user(email="bench@bench.com")
+    Borrowing.objects.create(
+        expected_return_date=timezone.now().date() + timedelta(days=7),
+        book=Book.objects.create(
+            title="Bench book",
+            author="Bench Author",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=1,
+        ),
+        user=user,
+    )
+    token = TokenClaimsSerializer.get_token(user).access_token
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+    url = reverse("borrowings:borrowing-list")
+
+    def request():
+        client.get(url)
+
+    results = []
+    for name, authentication in (
+            ("jwt", JWTAuthentication),
+            ("claims", ClaimsJWTAuthentication),
+    ):
+        # The user lookup puts the baseline over the list's query budget
+        with override_settings(QUERY_BUDGETS={}), mock.patch.object(
+                BorrowingViewSet, "throttle_classes", []
+        ), mock.patch.object(
+            BorrowingViewSet, "authentication_classes", [authentication]
+        ):
+            timed(request, 50)
+            with CaptureQueriesContext(connection) as queries:
+                request()
+            results.append({
+                "authentication": name,
+                "queries": len(queries),
+                **summarize(timed(request, repeat)),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.repeat)
+
+    for row in results:
+        print(
+            f"{row['authentication']:>6}: {row['queries']} queries, "
+            f"mean={row['mean_ms']:.3f}ms p50={row['p50_ms']:.3f}ms "
+            f"p99={row['p99_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
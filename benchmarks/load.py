@@ -0,0 +1,360 @@
+"""
+Load-test the hot API paths with concurrent clients.
+
+    python -m benchmarks.load --concurrency 8 --output load.json
+    DJANGO_ENV=production python -m benchmarks.load --output load-pg.json
+    python -m benchmarks.load --compare load.json
+
+Seeds a dataset into a throwaway database (SQLite by default, the
+configured Postgres with DJANGO_ENV=production), then drives, in order:
+book list, borrowing create, payment success, borrowing return and the
+overdue sweep. Requests go through the full Django stack in-process,
+with JWT auth and throttling. Stripe and Telegram are the local stand-ins
+with `--stripe-latency-ms` / `--telegram-latency-ms` of injected latency,
+and Celery tasks run on background threads like separate workers.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import (
+    BackgroundWorkers,
+    benchmark_database,
+    offline_services,
+    setup_django,
+    summarize,
+    write_results,
+)
+
+PASSWORD = "bench_psw"
+
+
+@contextmanager
+def sqlite_immediate_transactions():
+    """
+    Open SQLite transactions with BEGIN IMMEDIATE, like the
+    `transaction_mode` option of Django 5.1. With plain BEGIN, a
+    transaction that reads before it writes fails with "database is
+    locked" at once instead of waiting out the busy timeout.
+    """
+    from unittest import mock
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+
+    def begin_immediate(wrapper):
+        wrapper.cursor().execute("BEGIN IMMEDIATE")
+
+    with mock.patch.object(
+            DatabaseWrapper, "_start_transaction_under_autocommit", begin_immediate
+    ):
+        yield
+
+
+def seed(args, rng: random.Random) -> dict:
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+    from django.utils import timezone as django_timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+
+    User = get_user_model()
+    # Hashing once instead of per user keeps seeding in seconds
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        (
+            User(email=f"user{number}@bench.com", password=password)
+            for number in range(args.users)
+        ),
+        batch_size=5000,
+    )
+    Book.objects.bulk_create(
+        (
+            Book(
+                title=f"Book {number}",
+                author=f"Author {number % 500}",
+                cover=rng.choice(Book.CoverType.values),
+                inventory=args.requests + 10,
+                daily_fee=rng.randint(10, 300) / 100,
+            )
+            for number in range(args.books)
+        ),
+        batch_size=5000,
+    )
+    user_ids = list(User.objects.order_by("id").values_list("id", flat=True))
+    book_ids = list(Book.objects.order_by("id").values_list("id", flat=True))
+
+    # Users past args.requests borrowed before and are now overdue
+    today = django_timezone.now().date()
+    overdue_users = user_ids[args.requests:args.requests + args.overdue]
+    Borrowing.objects.bulk_create(
+        (
+            Borrowing(
+                expected_return_date=today - timedelta(days=rng.randint(1, 30)),
+                book_id=rng.choice(book_ids),
+                user_id=user_id,
+            )
+            for user_id in overdue_users
+        ),
+        batch_size=5000,
+    )
+    return {"user_ids": user_ids, "book_ids": book_ids}
+
+
+def tokens_for(user_ids) -> dict:
+    from rest_framework_simplejwt.tokens import AccessToken
+    from user.models import User
+
+    return {
+        user.id: f"Bearer {AccessToken.for_user(user)}"
+        for user in User.objects.filter(id__in=user_ids)
+    }
+
+
+def drive(name: str, calls: list, concurrency: int, expected: set) -> dict:
+    """
+    Run `calls`, (method, url, data, token) tuples, on `concurrency`
+    threads with one test client each and time every request. Responses
+    come back in the order of `calls`.
+    """
+    from django.db import connection
+    from django.test import Client
+
+    def worker(indexes):
+        client = Client(raise_request_exception=False)
+        outcomes = []
+        try:
+            for index in indexes:
+                method, url, data, token = calls[index]
+                started = time.perf_counter()
+                response = getattr(client, method)(
+                    url,
+                    data,
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION=token,
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+                outcomes.append((index, elapsed, response))
+        finally:
+            connection.close()
+        return outcomes
+
+    chunks = [
+        range(number, len(calls), concurrency) for number in range(concurrency)
+    ]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = [
+            outcome for chunk in executor.map(worker, chunks)
+            for outcome in chunk
+        ]
+    elapsed = time.perf_counter() - started
+
+    timings = [timing for _, timing, _ in outcomes]
+    responses = [response for _, _, response in sorted(
+        outcomes, key=lambda outcome: outcome[0]
+    )]
+    errors = sum(response.status_code not in expected for response in responses)
+    return {
+        "scenario": name,
+        "requests": len(calls),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(calls) / elapsed, 1),
+        **summarize(timings),
+    }, responses
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> list[float]:
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+
+def run(args, workers: BackgroundWorkers, rng: random.Random) -> list:
+    from django.urls import reverse
+    from django.utils import timezone as django_timezone
+    from borrowing.tasks import check_borrowings_overdue
+    from payment.gateway import get_gateway
+    from payment.models import Payment
+
+    data = seed(args, rng)
+    borrowers = data["user_ids"][:args.requests]
+    tokens = tokens_for(data["user_ids"][:args.requests + args.overdue])
+    readers = list(tokens.values())
+    results = []
+
+    calls = [
+        ("get", reverse("books:book-list"), {"limit": 20}, rng.choice(readers))
+        for _ in range(args.requests)
+    ]
+    results.append(drive("book_list", calls, args.concurrency, {200})[0])
+
+    popular = rng.choices(
+        data["book_ids"],
+        weights=zipf_weights(len(data["book_ids"])),
+        k=len(borrowers),
+    )
+    return_date = str(django_timezone.now().date() + timedelta(days=7))
+    calls = [
+        (
+            "post",
+            reverse("borrowings:borrowing-list"),
+            {"book": book_id, "expected_return_date": return_date},
+            tokens[user_id],
+        )
+        for user_id, book_id in zip(borrowers, popular)
+    ]
+    result, responses = drive("borrowing_create", calls, args.concurrency, {201})
+    results.append(result)
+    created = [
+        (response.json()["id"], response.json()["payment_id"], call[3])
+        for call, response in zip(calls, responses)
+        if response.status_code == 201
+    ]
+    # Checkout sessions are opened by the background workers
+    workers.drain()
+
+    sessions = dict(
+        Payment.objects.filter(
+            id__in=[payment_id for _, payment_id, _ in created]
+        ).values_list("id", "session_id")
+    )
+    calls = []
+    for _, payment_id, token in created:
+        session_id = sessions.get(payment_id)
+        if session_id:
+            get_gateway().complete(session_id)
+            calls.append((
+                "get",
+                reverse("payments:payment-success"),
+                {"session_id": session_id},
+                token,
+            ))
+    results.append(drive("payment_success", calls, args.concurrency, {200})[0])
+
+    calls = [
+        (
+            "post",
+            reverse("borrowings:borrowing-return-book", args=[borrowing_id]),
+            {},
+            token,
+        )
+        for borrowing_id, _, token in created
+    ]
+    results.append(drive("borrowing_return", calls, args.concurrency, {200})[0])
+    workers.drain()
+
+    timings, swept = [], {}
+    for _ in range(args.sweeps):
+        started = time.perf_counter()
+        swept = check_borrowings_overdue()
+        timings.append((time.perf_counter() - started) * 1000)
+    workers.drain()
+    results.append({
+        "scenario": "overdue_sweep",
+        "requests": args.sweeps,
+        "errors": 0,
+        "rows": swept.get("overdue", 0),
+        "rows_per_sec": swept.get("rows_per_sec", 0.0),
+        **summarize(timings),
+    })
+    return results
+
+
+def metadata(args, vendor: str) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "database": vendor,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": vars(args),
+    }
+
+
+def compare(previous: dict, current: dict):
+    before = {row["scenario"]: row for row in previous["scenarios"]}
+    print(f"\nCompared with {previous['meta'].get('commit')}:")
+    for row in current["scenarios"]:
+        old = before.get(row["scenario"])
+        if not old:
+            continue
+        change = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        print(
+            f"{row['scenario']:>17}: p95 {old['p95_ms']:.2f} -> "
+            f"{row['p95_ms']:.2f}ms ({change:+.1f}%)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--requests", type=int, default=1_000)
+    parser.add_argument("--overdue", type=int, default=2_000)
+    parser.add_argument("--sweeps", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--stripe-latency-ms", type=int, default=200)
+    parser.add_argument("--telegram-latency-ms", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+    if args.users < args.requests + args.overdue:
+        parser.error("--users must cover --requests plus --overdue")
+
+    setup_django()
+    from django.db import connection
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        # Threads share the SQLite database through a file
+        with benchmark_database(os.path.join(directory, "load.sqlite3")):
+            workers = BackgroundWorkers(args.workers)
+            with ExitStack() as stack:
+                if connection.vendor == "sqlite":
+                    connection.settings_dict["OPTIONS"]["timeout"] = 30
+                    stack.enter_context(sqlite_immediate_transactions())
+                stack.enter_context(
+                    offline_services(
+                        args.stripe_latency_ms, args.telegram_latency_ms
+                    )
+                )
+                stack.enter_context(workers.running())
+                scenarios = run(args, workers, rng)
+            results = {
+                "meta": metadata(args, connection.vendor),
+                "scenarios": scenarios,
+            }
+
+    for row in scenarios:
+        print(
+            f"{row['scenario']:>17}: {row['requests']} requests, "
+            f"{row['errors']} errors, p50={row['p50_ms']:.2f}ms "
+            f"p95={row['p95_ms']:.2f}ms p99={row['p99_ms']:.2f}ms"
+            + (f", {row['throughput_rps']} req/s" if "throughput_rps" in row else "")
+        )
+    write_results(args.output, results)
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), results)
+
+
+if __name__ == "__main__":
+    main()
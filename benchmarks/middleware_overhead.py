@@ -0,0 +1,81 @@
+"""
+Measure the per-request cost of QueryBudgetMiddleware.
+
+    python -m benchmarks.middleware_overhead --repeat 2000
+
+Times the same book list request with and without the middleware.
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+MIDDLEWARE = "library_service.middleware.QueryBudgetMiddleware"
+
+
+def run(repeat: int) -> list:
+    from django.contrib.auth import get_user_model
+    from unittest import mock
+    from django.test.utils import modify_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from book.models import Book
+    from book.views import BookViewSet
+
+    Book.objects.bulk_create(
+        Book(
+            title=f"Book {number}",
+            author="Bench Author",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=1,
+        )
+        for number in range(100)
+    )
+    client = APIClient()
+    client.force_authenticate(
+        get_user_model().objects.create_user(email="bench@bench.com")
+    )
+    url = reverse("books:book-list")
+
+    def request():
+        client.get(url)
+
+    # Throttle classes are bound at import time, so patch the view itself
+    unthrottled = mock.patch.object(BookViewSet, "throttle_classes", [])
+    results = []
+    for name, change in (
+            ("without", {"remove": MIDDLEWARE}),
+            ("with", {}),
+    ):
+        with unthrottled, modify_settings(MIDDLEWARE=change):
+            timed(request, 50)
+            results.append({"middleware": name, **summarize(timed(request, repeat))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.repeat)
+
+    for row in results:
+        print(
+            f"{row['middleware']:>7}: mean={row['mean_ms']:.3f}ms "
+            f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Count Telegram messages for a burst of events, with and without digests.
+
+    python -m benchmarks.notification_digest --events 1000 --telegram-latency-ms 50
+
+Queues `--events` borrowing notifications, then dispatches the outbox as
+the beat schedule would once the digest window is over. "per_event"
+clears NOTIFICATION_DIGEST_WINDOWS so every event is its own message.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks.common import (
+    benchmark_database,
+    offline_services,
+    setup_django,
+    write_results,
+)
+
+
+def run(events: int) -> list:
+    from django.conf import settings
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from tg_notifications import fake
+    from tg_notifications.models import OutboxMessage
+    from tg_notifications.notifications import queue_message
+    from tg_notifications.tasks import coalesce, dispatch_outbox
+
+    results = []
+    for mode, windows in (
+            ("per_event", {}),
+            ("digest", settings.NOTIFICATION_DIGEST_WINDOWS),
+    ):
+        OutboxMessage.objects.all().delete()
+        fake.outbox.clear()
+        with override_settings(NOTIFICATION_DIGEST_WINDOWS=windows):
+            started = time.perf_counter()
+            for number in range(events):
+                queue_message(
+                    f"New borrowing has been created\nBorrow id: {number}",
+                    OutboxMessage.EventType.BORROWING_CREATED,
+                    f"#{number} user{number}@bench.com | Book {number}",
+                )
+            coalesce(timezone.now() + timedelta(days=1))
+            dispatch_outbox()
+            elapsed = time.perf_counter() - started
+        results.append({
+            "mode": mode,
+            "events_in": events,
+            "messages_out": len(fake.outbox),
+            "elapsed_s": round(elapsed, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--telegram-latency-ms", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(), offline_services(
+            telegram_latency_ms=args.telegram_latency_ms
+    ):
+        results = run(args.events)
+
+    for row in results:
+        print(
+            f"{row['mode']:>9}: {row['events_in']} events -> "
+            f"{row['messages_out']} messages in {row['elapsed_s']}s"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
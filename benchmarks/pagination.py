@@ -0,0 +1,115 @@
+"""
+Compare LimitOffsetPagination with KeysetPagination across page depth.
+
+    python -m benchmarks.pagination --rows 200000 --output pagination.json
+
+Offset pages get slower the deeper they are (OFFSET n + COUNT(*)),
+keyset pages should stay flat.
+"""
+import argparse
+from base64 import b64encode
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from benchmarks.common import (
+    benchmark_database,
+    setup_django,
+    summarize,
+    timed,
+    write_results,
+)
+
+
+def seed(rows: int, batch_size: int = 10_000):
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+
+    user = get_user_model().objects.create_user(
+        email="bench@test.com", password="bench_psw"
+    )
+    book = Book.objects.create(
+        title="Bench book",
+        author="Bench Author",
+        cover=Book.CoverType.HARD,
+        inventory=1,
+        daily_fee=1,
+    )
+    return_date = timezone.now().date() + timedelta(days=7)
+    for start in range(0, rows, batch_size):
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                expected_return_date=return_date,
+                book=book,
+                user=user,
+            )
+            for _ in range(min(batch_size, rows - start))
+        )
+
+
+def run(rows: int, page_size: int, repeat: int) -> list[dict]:
+    from rest_framework.pagination import LimitOffsetPagination
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from borrowing.models import Borrowing
+    from library_service.pagination import KeysetPagination
+
+    factory = APIRequestFactory()
+    queryset = Borrowing.objects.all()
+    depths = sorted({0, 1_000, 10_000, rows // 2, rows - page_size})
+    results = []
+
+    for depth in depths:
+        if depth < 0 or depth >= rows:
+            continue
+        offset_request = Request(
+            factory.get("/", {"limit": page_size, "offset": depth})
+        )
+
+        def offset_page():
+            list(
+                LimitOffsetPagination().paginate_queryset(
+                    queryset.order_by("id"), offset_request
+                )
+            )
+
+        position = queryset.order_by("id").values_list("id", flat=True)[depth]
+        cursor = b64encode(urlencode({"p": position - 1}).encode()).decode()
+        keyset_request = Request(
+            factory.get("/", {"limit": page_size, "cursor": cursor})
+        )
+
+        def keyset_page():
+            list(KeysetPagination().paginate_queryset(queryset, keyset_request))
+
+        for name, func in (("offset", offset_page), ("keyset", keyset_page)):
+            results.append(
+                {"pagination": name, "depth": depth, **summarize(timed(func, repeat))}
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page-size", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        seed(args.rows)
+        results = run(args.rows, args.page_size, args.repeat)
+
+    for row in results:
+        print(
+            f"{row['pagination']:>7} depth={row['depth']:>9} "
+            f"p50={row['p50_ms']:.3f}ms p95={row['p95_ms']:.3f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure Stripe reconciliation throughput against the fake Stripe backend.
+
+    python -m benchmarks.reconciliation --payments 1000 --stripe-latency-ms 100
+
+Every run reconciles the same pending payments: a third of the sessions
+are paid, a third expired and the rest still open. Each `--concurrency`
+value is timed on a fresh copy of that state.
+"""
+import argparse
+import random
+
+from benchmarks.common import (
+    benchmark_database,
+    offline_services,
+    setup_django,
+    write_results,
+)
+
+
+def seed(payments: int) -> list:
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+    from payment.models import Payment
+    from payment.gateway import get_gateway
+    from payment.stripe_payment import payment_idempotency_key
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(email=f"user{number}@bench.com", password="!")
+        for number in range(payments)
+    )
+    book = Book.objects.create(
+        title="Bench book",
+        author="Bench Author",
+        cover=Book.CoverType.SOFT,
+        inventory=0,
+        daily_fee=1,
+    )
+    today = timezone.now().date()
+    Borrowing.objects.bulk_create(
+        Borrowing(expected_return_date=today, book=book, user_id=user_id)
+        for user_id in User.objects.values_list("id", flat=True)
+    )
+    Payment.objects.bulk_create(
+        Payment(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing_id=borrowing_id,
+            money_to_pay=7,
+        )
+        for borrowing_id in Borrowing.objects.values_list("id", flat=True)
+    )
+    gateway = get_gateway()
+    rng = random.Random(42)
+    pending = list(Payment.objects.all())
+    for payment in pending:
+        session = gateway.create_checkout_session(
+            {"line_items": [{"price_data": {"unit_amount": 700}}]},
+            idempotency_key=payment_idempotency_key(payment),
+        )
+        payment.session_id = session.id
+        outcome = rng.randrange(3)
+        if outcome == 1:
+            gateway.complete(session.id)
+        elif outcome == 2:
+            gateway.expire(session.id)
+    Payment.objects.bulk_update(pending, ["session_id"])
+    return [payment.id for payment in pending]
+
+
+def run(payment_ids: list, concurrency: int) -> dict:
+    from payment.models import Payment
+    from payment.tasks import check_session_for_expiration
+
+    Payment.objects.filter(id__in=payment_ids).update(
+        status=Payment.Status.PENDING
+    )
+    return {"concurrency": concurrency, **check_session_for_expiration(concurrency)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--stripe-latency-ms", type=int, default=100)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 10, 20]
+    )
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(), offline_services():
+        from payment.gateway import get_gateway
+
+        payment_ids = seed(args.payments)
+        # Latency only for the lookups under test, not for seeding
+        get_gateway().latency = args.stripe_latency_ms / 1000
+        results = [run(payment_ids, concurrency) for concurrency in args.concurrency]
+
+    for row in results:
+        print(
+            f"concurrency={row['concurrency']:>3}: {row['checked']} sessions "
+            f"in {row['runtime_s']}s ({row['sessions_per_sec']} sessions/sec), "
+            f"{row['paid']} paid, {row['expired']} expired"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Measure Stripe webhook throughput with locally signed fake events.
+
+    python -m benchmarks.stripe_webhook --payments 2000 --output webhook.json
+
+Half of the pending payments get `checkout.session.completed`, the other
+half `checkout.session.expired`. Every event is then delivered a second
+time, as Stripe does on retries, to time the idempotent no-op path.
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks.common import (
+    benchmark_database,
+    offline_services,
+    setup_django,
+    summarize,
+    write_results,
+)
+
+WEBHOOK_SECRET = "whsec_benchmark"
+
+
+def seed(payments: int) -> list[str]:
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+    from book.models import Book
+    from borrowing.models import Borrowing
+    from payment.models import Payment
+
+    User = get_user_model()
+    User.objects.bulk_create(
+        User(email=f"user{number}@bench.com", password="!")
+        for number in range(payments)
+    )
+    book = Book.objects.create(
+        title="Bench book",
+        author="Bench Author",
+        cover=Book.CoverType.SOFT,
+        inventory=0,
+        daily_fee=1,
+    )
+    return_date = timezone.now().date() + timedelta(days=7)
+    Borrowing.objects.bulk_create(
+        Borrowing(expected_return_date=return_date, book=book, user_id=user_id)
+        for user_id in User.objects.values_list("id", flat=True)
+    )
+    Payment.objects.bulk_create(
+        Payment(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing_id=borrowing_id,
+            session_id=f"cs_bench_{borrowing_id}",
+            money_to_pay=7,
+        )
+        for borrowing_id in Borrowing.objects.values_list("id", flat=True)
+    )
+    return list(Payment.objects.values_list("session_id", flat=True))
+
+
+def make_events(session_ids: list[str]) -> list[tuple[bytes, str]]:
+    from payment.fake_stripe import checkout_session_event, signed_event
+
+    events = []
+    for number, session_id in enumerate(session_ids):
+        if number % 2:
+            event = checkout_session_event(
+                session_id,
+                event_type="checkout.session.expired",
+                payment_status="unpaid",
+            )
+        else:
+            event = checkout_session_event(session_id)
+        events.append(signed_event(event, WEBHOOK_SECRET))
+    return events
+
+
+def deliver(events: list[tuple[bytes, str]]) -> dict:
+    from django.test import Client
+    from django.urls import reverse
+
+    client = Client()
+    url = reverse("payments:payment-webhook")
+    timings = []
+    started = time.perf_counter()
+    for payload, signature in events:
+        request_started = time.perf_counter()
+        response = client.post(
+            url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+        timings.append((time.perf_counter() - request_started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"Webhook answered {response.status_code}")
+    elapsed = time.perf_counter() - started
+    return {
+        "events": len(events),
+        "elapsed_s": round(elapsed, 3),
+        "events_per_sec": round(len(events) / elapsed, 1),
+        **summarize(timings),
+    }
+
+
+def run(payments: int) -> dict:
+    from django.test.utils import override_settings
+    from payment.models import Payment
+
+    events = make_events(seed(payments))
+    with override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET):
+        first = deliver(events)
+        replay = deliver(events)
+    return {
+        "payments": payments,
+        "first_delivery": first,
+        "replayed_delivery": replay,
+        "paid": Payment.objects.filter(status=Payment.Status.PAID).count(),
+        "expired": Payment.objects.filter(
+            status=Payment.Status.EXPIRED
+        ).count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=2000)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database(), offline_services():
+        result = run(args.payments)
+
+    for name in ("first_delivery", "replayed_delivery"):
+        row = result[name]
+        print(
+            f"{name:>17}: {row['events_per_sec']} events/s "
+            f"p50={row['p50_ms']:.3f}ms p95={row['p95_ms']:.3f}ms"
+        )
+    print(f"{'paid':>17}: {result['paid']}")
+    print(f"{'expired':>17}: {result['expired']}")
+    write_results(args.output, result)
+
+
+if __name__ == "__main__":
+    main()
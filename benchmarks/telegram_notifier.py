@@ -0,0 +1,73 @@
+"""
+Measure TelegramNotifier fan-out against a local Bot API stand-in.
+
+    python -m benchmarks.telegram_notifier --chats 20 --messages 3 --latency-ms 100
+
+"sequential" sends every message to one chat after another, "broadcast"
+fans each message out to all chats at once. Both stay within the per-chat
+and global rate limits; the busiest chat's observed rate is reported.
+"""
+import argparse
+import time
+
+from benchmarks.common import setup_django, write_results
+
+
+def run(chats: int, messages: int, latency_ms: int) -> list:
+    from tg_notifications.bot import TelegramNotifier
+    from tg_notifications.fake import FakeTelegramAdapter
+
+    chat_ids = [str(number) for number in range(chats)]
+    results = []
+    for mode in ("sequential", "broadcast"):
+        adapter = FakeTelegramAdapter(latency_ms=latency_ms)
+        notifier = TelegramNotifier("token", chat_ids, adapter=adapter)
+        started = time.perf_counter()
+        for number in range(messages):
+            if mode == "broadcast":
+                notifier.broadcast(f"message {number}")
+            else:
+                for chat_id in chat_ids:
+                    notifier.send(chat_id, f"message {number}")
+        elapsed = time.perf_counter() - started
+
+        per_chat = {}
+        for sent_at, payload in adapter.sent:
+            per_chat.setdefault(payload["chat_id"], []).append(sent_at)
+        busiest = max(
+            (len(times) - 1) / (times[-1] - times[0])
+            for times in per_chat.values()
+            if len(times) > 1
+        )
+        results.append({
+            "mode": mode,
+            "sent": len(adapter.sent),
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_sec": round(len(adapter.sent) / elapsed, 1),
+            "max_chat_rate": round(busiest, 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=3)
+    parser.add_argument("--latency-ms", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    results = run(args.chats, args.messages, args.latency_ms)
+
+    for row in results:
+        print(
+            f"{row['mode']:>10}: {row['sent']} messages in "
+            f"{row['elapsed_s']}s, {row['messages_per_sec']} msg/s, "
+            f"busiest chat {row['max_chat_rate']} msg/s"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
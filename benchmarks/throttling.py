@@ -0,0 +1,80 @@
+"""
+Measure the per-request cost of the throttle classes.
+
+    python -m benchmarks.throttling --repeat 5000 --users 100
+    python -m benchmarks.throttling --redis-url redis://localhost:6379/2
+
+Times `allow_request()` for DRF's UserRateThrottle (request history in
+the Django cache) and UserGCRAThrottle on the in-process and, with
+`--redis-url`, the Redis store. `--users` clients take turns, so each
+one's DRF history grows to about `repeat / users` entries.
+"""
+import argparse
+
+from benchmarks.common import setup_django, summarize, timed, write_results
+
+
+def run(repeat: int, users: int, redis_url: str = None) -> list:
+    from itertools import cycle
+    from types import SimpleNamespace
+    from unittest import mock
+    from django.test import override_settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import SimpleRateThrottle, UserRateThrottle
+    from library_service.throttling import UserGCRAThrottle
+
+    factory = APIRequestFactory()
+    requests = []
+    for user_id in range(1, users + 1):
+        request = Request(factory.get("/api/books/"))
+        request.user = SimpleNamespace(pk=user_id, is_authenticated=True)
+        requests.append(request)
+
+    # High enough that no request is throttled
+    rates = {"user": f"{repeat * 10}/day"}
+    backends = [
+        ("drf_cache", UserRateThrottle, None),
+        ("gcra_local", UserGCRAThrottle, None),
+    ]
+    if redis_url:
+        backends.append(("gcra_redis", UserGCRAThrottle, redis_url))
+
+    results = []
+    for name, throttle_class, url in backends:
+        # DRF binds its rates at import time, the GCRA classes do not
+        with override_settings(
+                THROTTLE_REDIS_URL=url,
+                REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": rates},
+        ), mock.patch.object(SimpleRateThrottle, "THROTTLE_RATES", rates):
+            clients = cycle(requests)
+
+            def request():
+                throttle_class().allow_request(next(clients), None)
+
+            timed(request, 50)
+            results.append({"throttle": name, **summarize(timed(request, repeat))})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--redis-url")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    setup_django()
+    results = run(args.repeat, args.users, args.redis_url)
+
+    for row in results:
+        print(
+            f"{row['throttle']:>10}: mean={row['mean_ms']:.4f}ms "
+            f"p50={row['p50_ms']:.4f}ms p99={row['p99_ms']:.4f}ms"
+        )
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
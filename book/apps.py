@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "book"
+
+    def ready(self):
+        from .cache import invalidate_catalog
+        from .search import ensure_search_index
+
+        post_migrate.connect(ensure_search_index, sender=self)
+        book = self.get_model("Book")
+        post_save.connect(invalidate_catalog, sender=book)
+        post_delete.connect(invalidate_catalog, sender=book)
@@ -0,0 +1,97 @@
+"""
+Read-through cache for the public book catalog.
+
+Entries are keyed by a catalog version. Any change to a book bumps the
+version instead of deleting keys, so every list page and detail cached
+before it is skipped at once and left to expire after `BOOK_CACHE_TTL`.
+
+Borrowing and returning only change a book's inventory, which the list
+leaves out, so they bump that book's own version and keep the rest of
+the catalog cached.
+"""
+import hashlib
+from functools import partial
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from library_service import versions
+from library_service.metrics import CACHE_REQUESTS
+
+VERSION_KEY = "books:version"
+
+
+def get_version() -> int:
+    return versions.get_version(VERSION_KEY)
+
+
+def bump_version() -> None:
+    versions.bump_version(VERSION_KEY)
+
+
+def invalidate_catalog(**kwargs) -> None:
+    """Drop every cached catalog entry. Also connected to Book signals."""
+    versions.invalidate(VERSION_KEY)
+
+
+def book_version_key(book_id) -> str:
+    return f"{VERSION_KEY}:{book_id}"
+
+
+def get_book_version(book_id) -> int:
+    return versions.get_version(book_version_key(book_id))
+
+
+def invalidate_book(book_id) -> None:
+    """Drop the cached detail of one book after an inventory change."""
+    versions.invalidate(book_version_key(book_id))
+
+
+def cache_key(request, name: str) -> str:
+    # Pagination links are absolute, so the host is part of the key
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(
+        f"{request.get_host()}|{params}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    return f"books:{get_version()}:{name}:{digest}"
+
+
+def cached_response(request, name: str, build: Callable[[], Response]) -> Response:
+    """
+    Serve `build()`'s data from the cache, keyed by `name` and the query
+    params. Only successful responses are stored.
+    """
+    key = cache_key(request, name)
+    data = cache.get(key)
+    if data is not None:
+        CACHE_REQUESTS.labels("books", "hit").inc()
+        response = Response(data)
+        response["X-Cache"] = "HIT"
+        return response
+
+    CACHE_REQUESTS.labels("books", "miss").inc()
+    response = build()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, settings.BOOK_CACHE_TTL)
+    response["X-Cache"] = "MISS"
+    return response
+
+
+class CatalogCacheMixin:
+    """Serves `list` and `retrieve` through `cached_response()`."""
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, "list", partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            f"detail:{kwargs['pk']}:{get_book_version(kwargs['pk'])}",
+            partial(super().retrieve, request, *args, **kwargs),
+        )
@@ -0,0 +1,391 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from itertools import accumulate, islice
+from typing import Iterable, Iterator
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from book.cache import invalidate_catalog
+from book.models import Book
+from borrowing.cache import invalidate_borrowings
+from borrowing.models import Borrowing
+from payment.calculations import FINE_MULTIPLIER
+from payment.models import Payment
+
+PASSWORD = "generated_psw"
+EMAIL_DOMAIN = "gen.example.com"
+PAYMENT_STATUSES = (
+    Payment.Status.PAID,
+    Payment.Status.PENDING,
+    Payment.Status.EXPIRED,
+)
+# Share of payments per status for active borrowings; returned ones are paid
+PAYMENT_STATUS_WEIGHTS = (0.85, 0.1, 0.05)
+FINE_PAID_SHARE = 0.9
+MAX_LOAN_DAYS = 30
+MAX_DAYS_LATE = 14
+HISTORY_DAYS = 365
+PAYMENT_COLUMNS = [
+    "id", "borrowing_id", "status", "type",
+    "money_to_pay", "session_id", "session_url", "updated_at",
+]
+
+
+def batched(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def next_id(model) -> int:
+    return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+
+@contextmanager
+def explicit_borrow_dates():
+    """
+    `borrow_date` is auto_now_add, which bulk_create would overwrite
+    with today. Switch that off while the history is written.
+    """
+    field = Borrowing._meta.get_field("borrow_date")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class CopyWriter:
+    """Streams rows into Postgres with COPY, one statement per batch."""
+
+    def write(self, model, columns: list[str], rows: list[tuple]):
+        table = connection.ops.quote_name(model._meta.db_table)
+        names = ", ".join(connection.ops.quote_name(name) for name in columns)
+        with connection.cursor() as cursor:
+            with cursor.cursor.copy(
+                    f"COPY {table} ({names}) FROM STDIN"
+            ) as copy:
+                for row in rows:
+                    copy.write_row(row)
+
+
+class BulkCreateWriter:
+    """Portable fallback for databases without COPY."""
+
+    def write(self, model, columns: list[str], rows: list[tuple]):
+        model.objects.bulk_create(
+            [model(**dict(zip(columns, row))) for row in rows],
+            batch_size=len(rows),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate synthetic books, users, borrowings and payments "
+        "for scaling tests"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--borrowings", type=int, default=1_000_000)
+        parser.add_argument(
+            "--active-share",
+            type=float,
+            default=0.15,
+            help="Share of borrowings not yet returned",
+        )
+        parser.add_argument(
+            "--overdue-share",
+            type=float,
+            default=0.05,
+            help="Share of borrowings past their expected return date",
+        )
+        parser.add_argument(
+            "--late-share",
+            type=float,
+            default=0.1,
+            help="Share of returned borrowings that came back late, with a fine",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Exponent of the book popularity distribution",
+        )
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--method",
+            choices=("auto", "copy", "bulk"),
+            default="auto",
+            help="COPY is used on Postgres by default, bulk_create elsewhere",
+        )
+
+    def handle(self, *args, **options):
+        if options["active_share"] + options["overdue_share"] > 1:
+            raise CommandError(
+                "--active-share and --overdue-share must add up to at most 1"
+            )
+        method = options["method"]
+        if method == "auto":
+            method = "copy" if connection.vendor == "postgresql" else "bulk"
+        if method == "copy" and connection.vendor != "postgresql":
+            raise CommandError("COPY is only available on PostgreSQL")
+
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.today = self.now.date().toordinal()
+        self.writer = CopyWriter() if method == "copy" else BulkCreateWriter()
+        self.stats = {}
+        batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        user_ids = self.insert(
+            get_user_model(), *self.user_rows(options["users"]), batch_size
+        )
+        fees = {}
+        book_ids = self.insert(
+            Book, *self.book_rows(options["books"], fees), batch_size
+        )
+        invalidate_catalog()
+        if options["borrowings"] and not (user_ids and book_ids):
+            raise CommandError("Borrowings need at least one user and one book")
+
+        # Payments follow each batch of borrowings, so only one batch of
+        # them is ever held in memory
+        payments = []
+        columns, borrowings = self.borrowing_rows(
+            options["borrowings"],
+            user_ids,
+            book_ids,
+            options["zipf"],
+            options["active_share"],
+            options["overdue_share"],
+            options["late_share"],
+            payments,
+        )
+        self.payment_id = next_id(Payment)
+        with explicit_borrow_dates():
+            for batch in batched(borrowings, batch_size):
+                with transaction.atomic():
+                    self.write(Borrowing, columns, batch)
+                    self.write(
+                        Payment, PAYMENT_COLUMNS, self.payment_rows(payments, fees)
+                    )
+                payments.clear()
+        invalidate_borrowings()
+
+        if method == "copy":
+            self.reset_sequences()
+        for model, (count, elapsed) in self.stats.items():
+            rate = round(count / elapsed, 1) if elapsed else 0.0
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Generated {count} {model._meta.verbose_name_plural} "
+                    f"in {elapsed:.2f}s, {rate} rows/sec"
+                )
+            )
+        total = sum(count for count, _ in self.stats.values())
+        self.stdout.write(
+            f"{total} rows in {time.perf_counter() - started:.2f}s "
+            "including generation"
+        )
+
+    def write(self, model, columns: list[str], rows: list[tuple]):
+        started = time.perf_counter()
+        self.writer.write(model, columns, rows)
+        count, elapsed = self.stats.get(model, (0, 0.0))
+        self.stats[model] = (
+            count + len(rows),
+            elapsed + time.perf_counter() - started,
+        )
+
+    def insert(self, model, columns, rows, batch_size: int) -> range:
+        """Write `rows` in batches and return the range of their ids."""
+        first_id = next_id(model)
+        count = 0
+        for batch in batched(rows, batch_size):
+            with transaction.atomic():
+                self.write(model, columns, batch)
+            count += len(batch)
+        return range(first_id, first_id + count)
+
+    def user_rows(self, count: int):
+        # Hashing once instead of per user is what keeps this fast
+        password = make_password(PASSWORD)
+        first_id = next_id(get_user_model())
+        columns = [
+            "id", "email", "password", "first_name", "last_name",
+            "is_staff", "is_superuser", "is_active", "date_joined",
+        ]
+        rows = (
+            (
+                user_id, f"user{user_id}@{EMAIL_DOMAIN}", password, "", "",
+                False, False, True, self.now,
+            )
+            for user_id in range(first_id, first_id + count)
+        )
+        return columns, rows
+
+    def book_rows(self, count: int, fees: dict):
+        """Books with random fees, also kept in `fees` by book id."""
+        rng = self.rng
+        covers = Book.CoverType.values
+        first_id = next_id(Book)
+        columns = [
+            "id", "title", "author", "cover",
+            "inventory", "daily_fee", "updated_at",
+        ]
+
+        def rows():
+            for book_id in range(first_id, first_id + count):
+                fees[book_id] = Decimal(rng.randint(10, 300)) / 100
+                yield (
+                    book_id,
+                    f"Book {book_id}",
+                    f"Author {rng.randrange(max(count // 20, 1))}",
+                    rng.choice(covers),
+                    rng.randint(1, 20),
+                    fees[book_id],
+                    self.now,
+                )
+
+        return columns, rows()
+
+    def borrowing_rows(
+            self,
+            count: int,
+            user_ids: range,
+            book_ids: range,
+            zipf: float,
+            active_share: float,
+            overdue_share: float,
+            late_share: float,
+            payments: list,
+    ):
+        """
+        Borrowings of Zipf-distributed books. `payments` collects
+        (borrowing id, book id, days, status, fine days) per borrowing
+        for `payment_rows()`.
+        """
+        rng = self.rng
+        today = self.today
+        cum_weights = list(
+            accumulate(1 / rank ** zipf for rank in range(1, len(book_ids) + 1))
+        )
+        # The books are shuffled so popularity does not follow the ids
+        popularity = list(book_ids)
+        rng.shuffle(popularity)
+        # One active borrowing per user and book, like unique_active_borrowing
+        active = set()
+        stride = book_ids.stop
+        first_id = next_id(Borrowing)
+        columns = [
+            "id", "user_id", "book_id", "borrow_date",
+            "expected_return_date", "actual_return_date", "updated_at",
+        ]
+
+        def rows():
+            for borrowing_id in range(first_id, first_id + count):
+                user_id = rng.choice(user_ids)
+                book_id = rng.choices(popularity, cum_weights=cum_weights)[0]
+                days = rng.randint(1, MAX_LOAN_DAYS)
+                share = rng.random()
+                if share < active_share + overdue_share:
+                    key = user_id * stride + book_id
+                    if key in active:
+                        share = 1.0
+                    else:
+                        active.add(key)
+
+                if share < overdue_share:
+                    expected = today - rng.randint(1, 60)
+                    returned = None
+                elif share < active_share + overdue_share:
+                    expected = today + rng.randint(0, days - 1)
+                    returned = None
+                else:
+                    borrowed = today - rng.randint(
+                        days + MAX_DAYS_LATE, HISTORY_DAYS
+                    )
+                    expected = borrowed + days
+                    if rng.random() < late_share:
+                        returned = expected + rng.randint(1, MAX_DAYS_LATE)
+                    else:
+                        returned = borrowed + rng.randint(1, days)
+                borrowed = expected - days
+
+                if returned is None:
+                    status = rng.choices(
+                        PAYMENT_STATUSES, weights=PAYMENT_STATUS_WEIGHTS
+                    )[0]
+                else:
+                    status = Payment.Status.PAID
+                fine_days = max((returned or 0) - expected, 0)
+                payments.append((borrowing_id, book_id, days, status, fine_days))
+                yield (
+                    borrowing_id,
+                    user_id,
+                    book_id,
+                    date.fromordinal(borrowed),
+                    date.fromordinal(expected),
+                    returned and date.fromordinal(returned),
+                    self.now,
+                )
+
+        return columns, rows()
+
+    def payment_rows(self, payments: list, fees: dict) -> list[tuple]:
+        """
+        A payment per borrowing, plus a fine for late returns. Session
+        ids are unique placeholders in the shape of Stripe's.
+        """
+        rng = self.rng
+        rows = []
+
+        def add(borrowing_id, status, payment_type, amount):
+            session_id = f"cs_gen_{self.payment_id}"
+            rows.append((
+                self.payment_id,
+                borrowing_id,
+                status,
+                payment_type,
+                amount,
+                session_id,
+                f"https://checkout.stripe.com/c/pay/{session_id}",
+                self.now,
+            ))
+            self.payment_id += 1
+
+        for borrowing_id, book_id, days, status, fine_days in payments:
+            fee = fees[book_id]
+            add(borrowing_id, status, Payment.Type.PAYMENT, fee * days)
+            if fine_days:
+                fine_status = (
+                    Payment.Status.PAID
+                    if rng.random() < FINE_PAID_SHARE
+                    else Payment.Status.PENDING
+                )
+                add(
+                    borrowing_id,
+                    fine_status,
+                    Payment.Type.FINE,
+                    fee * fine_days * FINE_MULTIPLIER,
+                )
+        return rows
+
+    def reset_sequences(self):
+        models = [get_user_model(), Book, Borrowing, Payment]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
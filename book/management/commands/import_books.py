@@ -0,0 +1,60 @@
+import io
+import shutil
+import sys
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.importer import (
+    IMPORT_FORMATS,
+    detect_format,
+    find_upload_error,
+    import_books,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream books from a CSV or NDJSON file into the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' for stdin")
+        parser.add_argument("--format", choices=IMPORT_FORMATS)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+
+        if path == "-":
+            # The whole input is checked before importing, so stdin is
+            # spooled to a file that can be read twice
+            raw = tempfile.TemporaryFile()
+            shutil.copyfileobj(sys.stdin.buffer, raw)
+            raw.seek(0)
+        else:
+            try:
+                raw = open(path, "rb")
+            except OSError as error:
+                raise CommandError(f"Cannot open {path}: {error}")
+
+        with raw:
+            error = find_upload_error(raw, file_format)
+            if error is not None:
+                raise CommandError(f"Row {error['row']}: {error['error']}")
+            stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            result = import_books(
+                read_rows(stream, file_format),
+                batch_size=options["batch_size"],
+            )
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.rows} rows "
+                f"(created {result.created}, updated {result.updated}, "
+                f"invalid {result.invalid}) in {result.elapsed:.2f}s, "
+                f"{result.rows_per_sec} rows/sec"
+            )
+        )
@@ -0,0 +1,59 @@
+from django.db import migrations
+
+POSTGRES_INDEX_NAME = "book_search_vector_idx"
+FTS_TABLE = "book_book_fts"
+
+# Must match `book.search.search_vector()` as Django compiles it,
+# otherwise Postgres cannot use the index for searches
+POSTGRES_INDEX = (
+    f"CREATE INDEX {POSTGRES_INDEX_NAME} ON book_book USING gin (("
+    "setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(author, '')), 'B')"
+    "))"
+)
+SQLITE_INDEX = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, author, content='book_book', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    "AFTER UPDATE OF title, author ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(POSTGRES_INDEX)
+    elif schema_editor.connection.vendor == "sqlite":
+        for sql in SQLITE_INDEX:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {POSTGRES_INDEX_NAME}")
+    elif schema_editor.connection.vendor == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0002_book_search_index"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="book",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["title", "cover"], name="book_title_cover_idx"),
+        ),
+    ]
@@ -1,9 +1,23 @@
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidate_book
 
 
 class Book(models.Model):
     class Meta:
         ordering = ["id"]
+        indexes = [
+            models.Index(fields=["title", "cover"], name="book_title_cover_idx"),
+        ]
+        constraints = [
+            # The natural key imports upsert on, also their lookup index
+            models.UniqueConstraint(
+                fields=["title", "author", "cover"],
+                name="book_natural_key",
+            ),
+        ]
 
     class CoverType(models.TextChoices):
         HARD = ("Hard", "hard")
@@ -14,6 +28,7 @@ class Book(models.Model):
     cover = models.CharField(max_length=4, choices=CoverType.choices)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return (
@@ -21,3 +36,26 @@ class Book(models.Model):
             f"author - {self.author}, "
             f"cover type - {self.cover.capitalize()}"
         )
+
+    @staticmethod
+    def take_copy(book_id: int) -> bool:
+        """
+        Reserve one copy with a single conditional UPDATE.
+        Returns False when no copy is left, so concurrent checkouts
+        can never push the inventory below zero.
+        """
+        taken = bool(
+            Book.objects.filter(id=book_id, inventory__gt=0).update(
+                inventory=F("inventory") - 1, updated_at=timezone.now()
+            )
+        )
+        if taken:
+            invalidate_book(book_id)
+        return taken
+
+    @staticmethod
+    def return_copy(book_id: int) -> None:
+        Book.objects.filter(id=book_id).update(
+            inventory=F("inventory") + 1, updated_at=timezone.now()
+        )
+        invalidate_book(book_id)
@@ -0,0 +1,118 @@
+import re
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "book_book_fts"
+
+SQLITE_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, author, content='book_book', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_FTS_TRIGGERS = (
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au "
+    "AFTER UPDATE OF title, author ON book_book "
+    f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author) "
+    "VALUES ('delete', old.id, old.title, old.author); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, author) "
+    "VALUES (new.id, new.title, new.author); END",
+)
+
+
+def search_vector():
+    """
+    Must stay identical to the expression of the `book_search_vector_idx`
+    GIN index, otherwise Postgres falls back to a sequential scan.
+    """
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector(
+        "title", weight="A", config=SEARCH_CONFIG
+    ) + SearchVector(
+        "author", weight="B", config=SEARCH_CONFIG
+    )
+
+
+def install_sqlite_index(cursor, rebuild: bool = True):
+    cursor.execute(SQLITE_FTS_TABLE)
+    for trigger in SQLITE_FTS_TRIGGERS:
+        cursor.execute(trigger)
+    if rebuild:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def ensure_search_index(using="default", **kwargs):
+    """
+    SQLite migrations that rebuild `book_book` drop its triggers, so the
+    FTS table is re-synced after `migrate` whenever a trigger went missing.
+    """
+    from django.db import connections
+
+    db = connections[using]
+    if db.vendor != "sqlite":
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f"{FTS_TABLE}%"],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        triggers = {f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"}
+        if not triggers <= existing:
+            install_sqlite_index(cursor)
+
+
+def _fts_query(terms: list[str]) -> str:
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms: list[str]) -> str:
+    # Prefix matches on every term, like the FTS5 query on SQLite
+    return " & ".join(f"'{term}':*" for term in terms)
+
+
+def search_books(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Return `queryset` filtered by a full-text match on title and author,
+    best matches first, as a single query served by the search index.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            _tsquery(terms), config=SEARCH_CONFIG, search_type="raw"
+        )
+        return (
+            queryset.annotate(search=search_vector())
+            .filter(search=search_query)
+            .annotate(rank=SearchRank(search_vector(), search_query))
+            .order_by("-rank", "id")
+        )
+
+    if connection.vendor == "sqlite":
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = book_book.id", f"{FTS_TABLE} MATCH %s"],
+            params=[_fts_query(terms)],
+            select={"rank": f"bm25({FTS_TABLE}, 10.0, 5.0)"},
+        ).order_by("rank", "id")
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(author__icontains=term)
+    return queryset.filter(condition)
@@ -21,7 +21,6 @@ class BookListSerializer(serializers.ModelSerializer):
             "title",
             "author",
             "cover",
-            "inventory",
             "daily_fee"
         ]
 
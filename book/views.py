@@ -1,3 +1,9 @@
+import io
+
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import (
     IsAuthenticated,
@@ -6,15 +12,37 @@ from rest_framework.permissions import (
 )
 from drf_spectacular.utils import (
     extend_schema_view,
-    extend_schema
+    extend_schema,
+    OpenApiParameter,
+)
+from library_service.export import export_response, get_export_format
+from library_service.pagination import KeysetPagination
+from library_service.conditional import ConditionalGetMixin
+from .cache import VERSION_KEY, CatalogCacheMixin, book_version_key
+from .importer import (
+    IMPORT_FORMATS,
+    detect_format,
+    find_upload_error,
+    import_books,
+    read_rows,
 )
 from .models import Book
+from .search import search_books
 from .serializers import (
     BookSerializer,
     BookListSerializer,
     BookRetrieveSerializer
 )
 
+BOOK_EXPORT_FIELDS = {
+    "id": "id",
+    "title": "title",
+    "author": "author",
+    "cover": "cover",
+    "inventory": "inventory",
+    "daily_fee": "daily_fee",
+}
+
 
 @extend_schema_view(
     create=extend_schema(
@@ -38,19 +66,36 @@ from .serializers import (
         description="Admin can delete book from book inventory",
     ),
 )
-class BookViewSet(ModelViewSet):
+class BookViewSet(ConditionalGetMixin, CatalogCacheMixin, ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    pagination_class = KeysetPagination
+    conditional_version_key = VERSION_KEY
+    conditional_per_user = False
+    throttle_scope = "books"
 
     def get_permissions(self):
-        if self.action in ["create", "update", "partial_update", "destroy"]:
+        if self.action in [
+            "create",
+            "update",
+            "partial_update",
+            "destroy",
+            "import_books",
+        ]:
             permission_classes = [IsAdminUser]
-        elif self.action == "list":
+        elif self.action in ["list", "search"]:
             permission_classes = [AllowAny]
         else:
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_version_keys(self) -> list[str]:
+        keys = super().get_version_keys()
+        if self.action == "retrieve":
+            # Borrowing and returning bump only the book they touch
+            keys.append(book_version_key(self.kwargs["pk"]))
+        return keys
+
     def get_serializer_class(self):
         if self.action in [
             "create",
@@ -60,7 +105,7 @@ class BookViewSet(ModelViewSet):
             "destroy"
         ]:
             return BookRetrieveSerializer
-        elif self.action == "list":
+        elif self.action in ["list", "search"]:
             return BookListSerializer
         return BookSerializer
 
@@ -72,3 +117,107 @@ class BookViewSet(ModelViewSet):
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
+
+    @extend_schema(
+        summary="Search books by title and author",
+        description="Everyone can run a full-text search over the catalog, "
+                    "best matches are returned first",
+        parameters=[
+            OpenApiParameter(
+                name="q",
+                description="Words to look for in book title or author",
+                type=str,
+                required=True,
+            ),
+            OpenApiParameter(
+                name="limit",
+                description="Maximum number of results (up to 100)",
+                type=int,
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="search")
+    def search(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response(
+                {"detail": "Query parameter 'q' is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), 100)
+        except ValueError:
+            limit = 20
+
+        books = search_books(self.get_queryset(), query)[:max(limit, 1)]
+        serializer = self.get_serializer(books, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Bulk import books",
+        description="Admin can upload a CSV or NDJSON file of books, "
+                    "rows are upserted on title, author and cover",
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {
+                    "file": {"type": "string", "format": "binary"},
+                    "format": {"type": "string", "enum": IMPORT_FORMATS},
+                },
+            }
+        },
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def import_books(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"detail": "Upload a CSV or NDJSON file as 'file'"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        file_format = request.data.get("format") or detect_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {"detail": f"Unsupported format: {file_format}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        error = find_upload_error(upload.file, file_format)
+        if error is not None:
+            return Response(
+                {
+                    "detail": f"Row {error['row']}: {error['error']}",
+                    "row": error["row"],
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8", newline="")
+        result = import_books(read_rows(stream, file_format))
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Export books",
+        description="Authenticated user can download the whole catalog "
+                    "as a streamed CSV or NDJSON file",
+        parameters=[
+            OpenApiParameter(
+                name="export_format",
+                description="File format: csv (default) or ndjson",
+                type=str,
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        return export_response(
+            request,
+            self.get_queryset(),
+            BOOK_EXPORT_FIELDS,
+            get_export_format(request),
+            "books",
+        )
@@ -1,6 +1,18 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete, post_save
 
 
 class BorrowingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "borrowing"
+
+    def ready(self):
+        from .cache import invalidate_borrowings
+
+        for model in (
+                self.get_model("Borrowing"),
+                apps.get_model("book", "Book"),
+                apps.get_model("payment", "Payment"),
+        ):
+            post_save.connect(invalidate_borrowings, sender=model)
+            post_delete.connect(invalidate_borrowings, sender=model)
@@ -0,0 +1,14 @@
+"""
+Version of the borrowing rows, for the conditional GET validators.
+
+Borrowings embed their book and payments, so writes to any of the three
+bump it: saves and deletes through the signals connected in
+`BorrowingConfig.ready()`, queryset `.update()` calls explicitly.
+"""
+from library_service import versions
+
+VERSION_KEY = "borrowings:version"
+
+
+def invalidate_borrowings(**kwargs) -> None:
+    versions.invalidate(VERSION_KEY)
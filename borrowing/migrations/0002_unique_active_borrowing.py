@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="borrowing",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("actual_return_date__isnull", True)),
+                fields=("user", "book"),
+                name="unique_active_borrowing",
+                violation_error_message="You have already borrowed this book and haven't returned it yet.",
+            ),
+        ),
+    ]
@@ -4,6 +4,20 @@ from django.conf import settings
 
 
 class Borrowing(models.Model):
+    class Meta:
+        constraints = [
+            # Also serves as the partial index for active-borrowing lookups
+            models.UniqueConstraint(
+                fields=["user", "book"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="unique_active_borrowing",
+                violation_error_message=(
+                    "You have already borrowed this book "
+                    "and haven't returned it yet."
+                ),
+            ),
+        ]
+
     borrow_date = models.DateField(auto_now_add=True)
     expected_return_date = models.DateField()
     actual_return_date = models.DateField(null=True, blank=True)
@@ -12,6 +26,7 @@ class Borrowing(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Borrow id: {self.id}, Book: {self.book.title}"
@@ -61,12 +76,13 @@ class Borrowing(models.Model):
             using=None,
             update_fields=None
     ):
-        self.full_clean()
+        # FK existence is enforced by the database and the duplicate-borrow
+        # rule by unique_active_borrowing, so only field values are checked
+        self.clean_fields(exclude=["book", "user"])
         if not self.pk:
-            if self.book.inventory == 0:
+            if not Book.take_copy(self.book_id):
                 raise ValueError("This book is not currently available")
-            self.book.inventory -= 1
-            self.book.save(update_fields=["inventory"])
+            self.book.inventory = max(self.book.inventory - 1, 0)
 
         super(
             Borrowing,
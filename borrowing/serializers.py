@@ -1,3 +1,4 @@
+from django.db import IntegrityError
 from rest_framework import serializers
 from payment.serializers import PaymentListSerializer
 from .models import Borrowing
@@ -23,6 +24,25 @@ class BorrowingSerializer(serializers.ModelSerializer):
         )
         return attrs
 
+    def create(self, validated_data):
+        # can_borrow() is the only lookup per create, a concurrent
+        # duplicate is still caught by the unique_active_borrowing constraint.
+        # SQLite does not name the constraint in its error, so the active
+        # borrowing is looked up before blaming it; anything else re-raises.
+        try:
+            return super().create(validated_data)
+        except IntegrityError:
+            if not Borrowing.objects.filter(
+                    user=validated_data["user"],
+                    book=validated_data["book"],
+                    actual_return_date__isnull=True,
+            ).exists():
+                raise
+            raise serializers.ValidationError(
+                "You have already borrowed this book "
+                "and haven't returned it yet."
+            )
+
 
 class BorrowingListSerializer(serializers.ModelSerializer):
     book = serializers.CharField(source="book.title", read_only=True)
@@ -1,34 +1,93 @@
+import logging
+import time
+from decimal import Decimal
+
 from .models import Borrowing
 from celery import shared_task
 from django.utils import timezone
-from tg_notifications.notifications import send_message
-from payment.calculations import calculate_fine
+from tg_notifications.models import OutboxMessage
+from tg_notifications.notifications import queue_message, queue_messages
+from payment.calculations import fine_expression
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_CHUNK_SIZE = 2000
+# Rows per Telegram message, keeps each digest under the 4096 chars limit
+OVERDUE_DIGEST_SIZE = 40
+# Digests written to the outbox per insert
+OVERDUE_FLUSH_SIZE = 25
+
+
+def overdue_line(row, fine: Decimal) -> str:
+    borrowing_id, email, title, author, cover, expected_return_date, _ = row
+    return (
+        f"#{borrowing_id} {email} | {title} ({author}, {cover}) | "
+        f"due {expected_return_date} | fine {fine}$"
+    )
 
 
 @shared_task()
 def check_borrowings_overdue():
+    started = time.perf_counter()
     now = timezone.now().date()
-    overdue_borrowings = Borrowing.objects.filter(
-        expected_return_date__lt=now,
-        actual_return_date__isnull=True
+    overdue_borrowings = (
+        Borrowing.objects.filter(
+            expected_return_date__lt=now,
+            actual_return_date__isnull=True
+        )
+        .annotate(fine=fine_expression(now))
+        .order_by("id")
+        .values_list(
+            "id",
+            "user__email",
+            "book__title",
+            "book__author",
+            "book__cover",
+            "expected_return_date",
+            "fine",
+        )
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
     )
 
-    if overdue_borrowings.exists():
-        for borrowing in overdue_borrowings:
-            fine_amount = calculate_fine(
-                borrowing.expected_return_date, now, borrowing.book.daily_fee
-            )
-            message = (
-                f"Overdue borrowing!\n"
-                f"Borrow id: {borrowing.id}\n"
-                f"User: {borrowing.user.email}\n"
-                f"Book: {borrowing.book.title},\n"
-                f"Author: {borrowing.book.author}, "
-                f"cover({borrowing.book.cover})\n"
-                f"User was supposed to return this book on: "
-                f"{borrowing.expected_return_date}\n"
-                f"User has to pay {fine_amount}$ fine"
-            )
-            send_message(message)
+    overdue_count = 0
+    total_fine = Decimal("0.00")
+    lines, digests = [], []
+    for row in overdue_borrowings:
+        # SQLite hands back computed decimals unquantized
+        fine = round(row[-1], 2)
+        overdue_count += 1
+        total_fine += fine
+        lines.append(overdue_line(row, fine))
+        if len(lines) == OVERDUE_DIGEST_SIZE:
+            digests.append("Overdue borrowings:\n" + "\n".join(lines))
+            lines = []
+        if len(digests) == OVERDUE_FLUSH_SIZE:
+            queue_messages(digests, OutboxMessage.EventType.OVERDUE)
+            digests = []
+    if lines:
+        digests.append("Overdue borrowings:\n" + "\n".join(lines))
+    if digests:
+        queue_messages(digests, OutboxMessage.EventType.OVERDUE)
+
+    runtime = time.perf_counter() - started
+    rows_per_sec = round(overdue_count / runtime, 1) if runtime else 0.0
+    if overdue_count:
+        queue_message(
+            f"Overdue borrowings today: {overdue_count}\n"
+            f"Total fines: {total_fine}$"
+        )
     else:
-        send_message("No borrowings overdue today!")
+        queue_message("No borrowings overdue today!")
+
+    logger.info(
+        "Overdue sweep: %s rows in %.3fs (%s rows/sec)",
+        overdue_count,
+        runtime,
+        rows_per_sec,
+    )
+    return {
+        "overdue": overdue_count,
+        "total_fine": str(total_fine),
+        "runtime_s": round(runtime, 3),
+        "rows_per_sec": rows_per_sec,
+    }
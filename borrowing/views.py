@@ -1,6 +1,7 @@
 from django.utils import timezone
 from rest_framework import status
 from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework.exceptions import ValidationError
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -12,6 +13,9 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiExample,
 )
+from library_service.conditional import ConditionalGetMixin
+from library_service.export import export_response, get_export_format
+from library_service.pagination import KeysetPagination
 from payment.calculations import calculate_fine
 from payment.stripe_payment import create_checkout_session, create_fine_payment
 from .serializers import (
@@ -20,9 +24,30 @@ from .serializers import (
     BorrowingRetrieveSerializer,
     ReturnBookSerializer,
 )
+from book.models import Book
 from payment.models import Payment
+from .cache import VERSION_KEY, invalidate_borrowings
 from .models import Borrowing
-from tg_notifications.notifications import send_message
+from tg_notifications.models import OutboxMessage
+from tg_notifications.notifications import queue_message
+
+BORROWING_EXPORT_FIELDS = {
+    "id": "id",
+    "borrow_date": "borrow_date",
+    "expected_return_date": "expected_return_date",
+    "actual_return_date": "actual_return_date",
+    "book_id": "book_id",
+    "book": "book__title",
+    "user_id": "user_id",
+    "user_email": "user__email",
+}
+
+
+def return_summary(borrowing, outcome: str) -> str:
+    return (
+        f"#{borrowing.id} {borrowing.user.email} | "
+        f"{borrowing.book.title} ({borrowing.book.cover}) | {outcome}"
+    )
 
 
 @extend_schema_view(
@@ -40,9 +65,12 @@ from tg_notifications.notifications import send_message
         description="Admin can delete users borrowings",
     ),
 )
-class BorrowingViewSet(ModelViewSet):
+class BorrowingViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
+    pagination_class = KeysetPagination
+    throttle_scope = "borrowings"
+    conditional_version_key = VERSION_KEY
 
     def get_permissions(self):
         if self.action in ["destroy"]:
@@ -67,7 +95,9 @@ class BorrowingViewSet(ModelViewSet):
             )
 
         borrowing = serializer.save(user=user)
-        create_checkout_session(borrowing)
+        # Only a PENDING row here; the Stripe session is opened after
+        # commit so the HTTP call never holds the book's row lock.
+        self.payment = create_checkout_session(borrowing)
         message = (
             f"New borrowing has been created\n"
             f"Borrow id: {borrowing.id}\n"
@@ -78,7 +108,16 @@ class BorrowingViewSet(ModelViewSet):
             f"Daily fee {borrowing.book.daily_fee}$"
         )
 
-        send_message(message)
+        queue_message(
+            message,
+            OutboxMessage.EventType.BORROWING_CREATED,
+            return_summary(borrowing, f"due {borrowing.expected_return_date}"),
+        )
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.data["payment_id"] = self.payment.id
+        return response
 
     def get_queryset(self):
         queryset = self.queryset
@@ -93,7 +132,14 @@ class BorrowingViewSet(ModelViewSet):
             queryset = queryset.filter(user_id=user_id)
         if not self.request.user.is_staff:
             queryset = self.queryset.filter(user=self.request.user)
-        if self.action in ("list", "retrieve"):
+        if self.action == "list":
+            return queryset.select_related("book", "user").prefetch_related(
+                Prefetch(
+                    "payments",
+                    queryset=Payment.objects.select_related("borrowing__user"),
+                )
+            )
+        if self.action in ("retrieve", "return_book"):
             return queryset.select_related("book", "user")
         return queryset
 
@@ -129,6 +175,29 @@ class BorrowingViewSet(ModelViewSet):
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        summary="Export borrowings",
+        description="Authenticated user can download own borrowings, "
+                    "admin can download all of them, as a streamed "
+                    "CSV or NDJSON file",
+        parameters=[
+            OpenApiParameter(
+                name="export_format",
+                description="File format: csv (default) or ndjson",
+                type=str,
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        return export_response(
+            request,
+            self.get_queryset(),
+            BORROWING_EXPORT_FIELDS,
+            get_export_format(request),
+            "borrowings",
+        )
+
     def update(self, request, *args, **kwargs):
         borrowing = self.get_object()
         user = self.request.user
@@ -153,26 +222,20 @@ class BorrowingViewSet(ModelViewSet):
     @transaction.atomic()
     def return_book(self, request, pk=None):
         borrowing = self.get_object()
-        if borrowing.actual_return_date is not None:
+        return_date = timezone.now().date()
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk,
+            actual_return_date__isnull=True
+        ).update(actual_return_date=return_date, updated_at=timezone.now())
+        if not returned:
             return Response(
                 {"detail": "You have already returned this book"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        invalidate_borrowings()
 
-        serializer = self.get_serializer(
-            borrowing,
-            data=request.data,
-            partial=True
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-
-        book = borrowing.book
-        book.inventory += 1
-
-        borrowing.actual_return_date = timezone.now().date()
-        borrowing.save()
-        book.save()
+        borrowing.actual_return_date = return_date
+        Book.return_copy(borrowing.book_id)
 
         if borrowing.actual_return_date > borrowing.expected_return_date:
             fine = calculate_fine(
@@ -189,10 +252,16 @@ class BorrowingViewSet(ModelViewSet):
                 f"{borrowing.user.email} has to pay {fine}$ fine"
             )
 
-            send_message(fine_message)
-            create_fine_payment(borrowing)
+            queue_message(
+                fine_message,
+                OutboxMessage.EventType.BORROWING_RETURNED,
+                return_summary(borrowing, f"fine {fine}$"),
+            )
+            payment = create_fine_payment(borrowing)
 
-            return Response({"attention": f"Please,pay {fine}$ fine"})
+            return Response(
+                {"attention": f"Please,pay {fine}$ fine", "payment_id": payment.id}
+            )
         else:
             message = (
                 f"{borrowing.user.email} has returned book "
@@ -201,7 +270,11 @@ class BorrowingViewSet(ModelViewSet):
                 f"Borrowing id: {borrowing.id}\n"
                 f"Return date: {borrowing.actual_return_date}"
             )
-            send_message(message)
+            queue_message(
+                message,
+                OutboxMessage.EventType.BORROWING_RETURNED,
+                return_summary(borrowing, "on time"),
+            )
 
         return Response(
             {"detail": "Book returned in time, no fine required."},
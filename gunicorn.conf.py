@@ -0,0 +1,39 @@
+"""
+Production server profile: `gunicorn -c gunicorn.conf.py`.
+
+Uvicorn workers serve the ASGI application, so async views wait on
+Stripe without holding a thread, and sync views run in a thread each.
+"""
+import multiprocessing
+import os
+
+from prometheus_client import multiprocess
+
+wsgi_app = "library_service.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(
+    os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1)
+)
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = 10_000
+max_requests_jitter = 1_000
+accesslog = "-"
+
+
+def on_starting(server):
+    # Files a previous run left behind would be summed into the new metrics
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a dead worker from the multiprocess metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,42 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    `APIView` for handlers that are coroutines, e.g. `async def get()`.
+
+    Under ASGI the handler awaits its outbound calls on the event loop
+    instead of holding a thread while it waits. Authentication,
+    permission and throttle checks may query the database or Redis, so
+    they run in the request's sync thread first. Under WSGI Django runs
+    the whole view through `async_to_sync()`, so it works in both.
+    """
+
+    # DRF's own `options()` is sync, which Django would reject as mixed
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = self.http_method_not_allowed
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(
+                    self, request.method.lower(), self.http_method_not_allowed
+                )
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
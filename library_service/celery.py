@@ -1,6 +1,9 @@
 import os
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init
+
+from library_service import metrics
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_service.settings")
@@ -18,6 +21,20 @@ app.autodiscover_tasks()
 
 app.conf.beat_schedule = {}
 
+task_prerun.connect(metrics.task_prerun)
+task_postrun.connect(metrics.task_postrun)
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from django.conf import settings
+    from prometheus_client import start_http_server
+
+    if settings.CELERY_METRICS_PORT:
+        start_http_server(
+            int(settings.CELERY_METRICS_PORT), registry=metrics.get_registry()
+        )
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
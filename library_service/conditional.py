@@ -0,0 +1,67 @@
+import hashlib
+from functools import partial
+from typing import Callable
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .versions import get_version
+
+
+class ConditionalGetMixin:
+    """
+    Strong ETag and Last-Modified for `list` and `retrieve`.
+
+    The validators come from the `conditional_version_key` counter in the
+    cache (plus any narrower keys from `get_version_keys()`), which every write to the serialized rows bumps (see
+    `library_service.versions`), so they cost no query however large the
+    filtered queryset is. A matching If-None-Match or If-Modified-Since
+    gets a 304 before any page is fetched or serialized. Any write
+    refreshes the validators of every page and detail under the counter.
+    """
+
+    # Version counter bumped by the writes that change the serialized rows
+    conditional_version_key = None
+    # Whether the rows depend on who asks, beyond the queryset filtering
+    conditional_per_user = True
+
+    def get_version_keys(self) -> list[str]:
+        return [self.conditional_version_key]
+
+    def get_validators(self) -> tuple[str, int]:
+        versions = [get_version(key) for key in self.get_version_keys()]
+        source = repr((
+            self.basename,
+            self.action,
+            sorted(self.kwargs.items()),
+            self.request.user.pk if self.conditional_per_user else None,
+            sorted(self.request.query_params.lists()),
+            versions,
+        ))
+        digest = hashlib.sha1(source.encode(), usedforsecurity=False).hexdigest()
+        return f'"{digest}"', max(versions) // 10 ** 9
+
+    def conditional_response(self, build: Callable):
+        etag, timestamp = self.get_validators()
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = build()
+            if response.status_code != 200:
+                return response
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(timestamp)
+        # Representations differ per user, so shared caches must not keep them
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            partial(super().list, request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            partial(super().retrieve, request, *args, **kwargs)
+        )
@@ -0,0 +1,144 @@
+"""
+Prometheus metrics for the API, Celery tasks and outbound calls.
+
+Set `PROMETHEUS_MULTIPROC_DIR` to an empty, shared directory when running
+several worker processes: every process then writes its samples there
+and `/metrics` aggregates them, whichever process answers the scrape.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+REQUEST_LATENCY = Histogram(
+    "library_http_request_duration_seconds",
+    "API request latency",
+    ["view", "action", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "library_http_request_db_queries",
+    "SQL queries per API request",
+    ["view", "action"],
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, float("inf")),
+)
+EXTERNAL_CALL_LATENCY = Histogram(
+    "library_external_call_duration_seconds",
+    "Latency of outbound Stripe and Telegram calls",
+    ["service"],
+)
+TASK_LATENCY = Histogram(
+    "library_celery_task_duration_seconds",
+    "Celery task run time",
+    ["task", "outcome"],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, float("inf")),
+)
+TASK_RUNS = Counter(
+    "library_celery_task_runs",
+    "Finished Celery task runs",
+    ["task", "outcome"],
+)
+NOTIFICATION_EVENTS = Counter(
+    "library_notification_events",
+    "Notification events queued, per event type",
+    ["event_type"],
+)
+NOTIFICATION_MESSAGES = Counter(
+    "library_notification_messages",
+    "Telegram messages delivered, per event type",
+    ["event_type"],
+)
+CACHE_REQUESTS = Counter(
+    "library_cache_requests",
+    "Read-through cache lookups",
+    ["cache", "result"],
+)
+THROTTLED_REQUESTS = Counter(
+    "library_throttled_requests",
+    "Requests rejected with 429, per throttle scope",
+    ["scope"],
+)
+BUSINESS_GAUGES_CACHE_KEY = "metrics:business_gauges"
+
+
+def business_gauges() -> dict:
+    from borrowing.models import Borrowing
+    from payment.models import Payment
+
+    return {
+        "active_borrowings": Borrowing.objects.filter(
+            actual_return_date__isnull=True
+        ).count(),
+        "pending_payments": Payment.objects.filter(
+            status=Payment.Status.PENDING
+        ).count(),
+    }
+
+
+class BusinessCollector:
+    """
+    Library-wide gauges, counted at most once per `METRICS_GAUGE_TTL`.
+
+    The values live in the shared cache, so scrapes hitting any process
+    reuse them instead of running COUNTs each time. They describe the
+    database rather than a process, so they bypass multiprocess files.
+    """
+
+    def collect(self):
+        values = cache.get_or_set(
+            BUSINESS_GAUGES_CACHE_KEY,
+            business_gauges,
+            settings.METRICS_GAUGE_TTL,
+        )
+        for name, value in values.items():
+            gauge = GaugeMetricFamily(f"library_{name}", name.replace("_", " "))
+            gauge.add_metric([], value)
+            yield gauge
+
+
+class _DefaultCollectors:
+    """Forwards this process's default registry into a scrape registry."""
+
+    def collect(self):
+        return REGISTRY.collect()
+
+
+def get_registry() -> CollectorRegistry:
+    registry = CollectorRegistry()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        MultiProcessCollector(registry)
+    else:
+        registry.register(_DefaultCollectors())
+    registry.register(BusinessCollector())
+    return registry
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+_task_started = {}
+
+
+def task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    outcome = (state or "UNKNOWN").lower()
+    TASK_RUNS.labels(task.name, outcome).inc()
+    if started is not None:
+        TASK_LATENCY.labels(task.name, outcome).observe(
+            time.perf_counter() - started
+        )
@@ -0,0 +1,177 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import connections
+
+from .metrics import REQUEST_LATENCY, REQUEST_QUERIES
+from .timing import collect
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryStats:
+    """`execute_wrapper` that counts queries and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def get_query_budget(method: str, match):
+    """
+    Look up "<METHOD> <view name>", then the view name, its namespace
+    and finally "default" in `QUERY_BUDGETS`.
+    """
+    budgets = settings.QUERY_BUDGETS
+    keys = (
+        f"{method} {match.view_name}",
+        match.view_name,
+        match.namespace,
+        "default",
+    )
+    for key in keys:
+        if key in budgets:
+            return budgets[key]
+    return None
+
+
+class QueryBudgetMiddleware:
+    """
+    Count SQL queries per request and report them with outbound call time.
+
+    The stats are attached as `request.query_stats` and sent back in a
+    `Server-Timing` header (db, stripe, telegram, total). When a view runs
+    more queries than `QUERY_BUDGETS` allows, it is logged, or raised as
+    `QueryBudgetExceeded` with `QUERY_BUDGET_ACTION = "raise"`. Bodies of
+    streaming responses are produced after this returns and are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def watch_queries(stack: ExitStack, stats: QueryStats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        stats = request.query_stats = QueryStats()
+        with ExitStack() as stack:
+            self.watch_queries(stack, stats)
+            external = stack.enter_context(collect())
+            response = self.get_response(request)
+        return self.report(request, response, stats, external, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        stats = request.query_stats = QueryStats()
+        # Under ASGI the ORM runs in the request's sync_to_async thread,
+        # which has its own connections, so the wrappers go there
+        queries = ExitStack()
+        await sync_to_async(self.watch_queries)(queries, stats)
+        try:
+            with collect() as external:
+                response = await self.get_response(request)
+        finally:
+            await sync_to_async(queries.close)()
+        return self.report(request, response, stats, external, started)
+
+    def report(self, request, response, stats, external, started):
+        total = time.perf_counter() - started
+        self.check_budget(request, stats)
+        metrics = [f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"']
+        metrics += [
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in external.items()
+        ]
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        response["Server-Timing"] = ", ".join(metrics)
+        return response
+
+    def check_budget(self, request, stats: QueryStats):
+        match = request.resolver_match
+        if match is None:
+            return
+        budget = get_query_budget(request.method, match)
+        if budget is None or stats.count <= budget:
+            return
+        message = (
+            f"{request.method} {match.view_name} ran {stats.count} queries, "
+            f"budget is {budget}"
+        )
+        if settings.QUERY_BUDGET_ACTION == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class MetricsMiddleware:
+    """
+    Record request latency and query counts per DRF view and action.
+
+    Placed before `QueryBudgetMiddleware`, which supplies the query count.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        return self.observe(request, self.get_response(request), started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        return self.observe(request, await self.get_response(request), started)
+
+    def observe(self, request, response, started):
+        match = request.resolver_match
+        if match is None:
+            return response
+
+        view = match.view_name
+        action = getattr(request, "metrics_action", "")
+        REQUEST_LATENCY.labels(
+            view, action, request.method, response.status_code
+        ).observe(time.perf_counter() - started)
+        stats = getattr(request, "query_stats", None)
+        if stats is not None:
+            REQUEST_QUERIES.labels(view, action).observe(stats.count)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Viewsets are routed with {"get": "list", ...}; plain views are not
+        actions = getattr(view_func, "actions", None) or {}
+        request.metrics_action = actions.get(request.method.lower(), "")
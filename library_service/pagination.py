@@ -0,0 +1,104 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Limit/offset pagination by default, with opt-in cursor pages that
+    seek on the model ordering instead of OFFSET.
+
+    A plain request gets the LimitOffset response clients always had,
+    `count` included. `?pagination=cursor`, or any `?cursor=` from a
+    previous page, switches to cursor pages: each one is a single
+    `WHERE key > cursor ORDER BY key LIMIT n` query with no COUNT(*), so
+    page N costs the same as page 1. Cursor pages add `count` only when
+    asked with `?count=true`. Viewsets opt in with
+    `pagination_class = KeysetPagination` and may override the seek key
+    with a `cursor_ordering` attribute.
+    """
+
+    page_size_query_param = "limit"
+    max_page_size = 100
+    mode_query_param = "pagination"
+    count_query_param = "count"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = (
+            getattr(view, "cursor_ordering", None)
+            or queryset.model._meta.ordering
+            or ("id",)
+        )
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def wants_cursor(self, request) -> bool:
+        return (
+            self.cursor_query_param in request.query_params
+            or request.query_params.get(self.mode_query_param) == "cursor"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.offset_pagination = None
+        self.count = None
+        if not self.wants_cursor(request):
+            self.offset_pagination = LimitOffsetPagination()
+            self.offset_pagination.max_limit = self.max_page_size
+            return self.offset_pagination.paginate_queryset(
+                queryset.order_by(*self.get_ordering(request, queryset, view)),
+                request,
+                view,
+            )
+
+        if request.query_params.get(self.count_query_param, "").lower() in (
+                "1", "true", "yes"
+        ):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.offset_pagination is not None:
+            return self.offset_pagination.get_paginated_response(data)
+        if self.count is None:
+            return super().get_paginated_response(data)
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"] = {
+            "count": {"type": "integer", "example": 123},
+            **schema["properties"],
+        }
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return LimitOffsetPagination().get_schema_operation_parameters(
+            view
+        ) + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "`cursor` for keyset pages without a count",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Add the total `count` to a cursor page",
+                "schema": {"type": "boolean"},
+            },
+        ]
@@ -14,10 +14,14 @@ from datetime import timedelta
 from pathlib import Path
 
 from celery.schedules import crontab
+from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Outside Docker the settings below come from .env, see .env.sample
+load_dotenv(BASE_DIR / ".env")
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
@@ -45,12 +49,15 @@ INSTALLED_APPS = [
     "borrowing",
     "payment",
     "user",
+    "tg_notifications",
     "django_celery_beat",
 ]
 AUTH_USER_MODEL = "user.User"
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "library_service.middleware.MetricsMiddleware",
+    "library_service.middleware.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -61,8 +68,73 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "library_service.urls"
 
+# Max SQL queries per "<METHOD> <view name>", view name or URL namespace;
+# None means unlimited. Transaction statements count as queries.
+# List budgets include the COUNT of the default offset pages.
+QUERY_BUDGETS = {
+    "default": 10,
+    "admin": None,
+    "GET books:book-list": 3,
+    "GET books:book-search": 2,
+    "GET borrowings:borrowing-list": 4,
+    "POST borrowings:borrowing-list": 12,
+    "GET payments:payment-list": 3,
+}
+# "log" a warning or "raise" QueryBudgetExceeded when a budget is exceeded
+QUERY_BUDGET_ACTION = os.environ.get("QUERY_BUDGET_ACTION", "log")
+
+# /metrics requires "Authorization: Bearer <token>" when set, and is
+# closed in production (DJANGO_ENV) until it is
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# Seconds the active borrowings / pending payments gauges are cached
+METRICS_GAUGE_TTL = 30
+# Celery workers serve their own /metrics on this port when set
+CELERY_METRICS_PORT = os.environ.get("CELERY_METRICS_PORT")
+
 BASE_URL = "http://localhost:8000/"
 
+STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+# "payment.fake_stripe.FakeStripeGateway" answers locally for load tests
+STRIPE_BACKEND = os.environ.get("STRIPE_BACKEND", "payment.gateway.StripeGateway")
+STRIPE_TIMEOUT = 10
+STRIPE_MAX_NETWORK_RETRIES = 3
+STRIPE_POOL_SIZE = 20
+STRIPE_FAKE_LATENCY_MS = int(os.environ.get("STRIPE_FAKE_LATENCY_MS", 0))
+
+TG_TOKEN = os.environ.get("TG_TOKEN")
+# Comma-separated, every chat gets each notification
+TELEGRAM_CHAT_IDS = [
+    chat_id.strip()
+    for chat_id in os.environ.get("CHAT_ID", "").split(",")
+    if chat_id.strip()
+]
+# "tg_notifications.fake.send_message" only records messages, for load tests
+TELEGRAM_BACKEND = os.environ.get(
+    "TELEGRAM_BACKEND", "tg_notifications.notifications.send_telegram_message"
+)
+TELEGRAM_TIMEOUT = 10
+TELEGRAM_POOL_SIZE = 8
+# Bot API flood limits: about 30 messages per second overall, 1 per chat
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_MAX_RETRIES = 3
+# Longer 429 waits are left to the outbox retry schedule
+TELEGRAM_MAX_RETRY_AFTER = 30
+TELEGRAM_FAKE_LATENCY_MS = int(os.environ.get("TELEGRAM_FAKE_LATENCY_MS", 0))
+
+# Seconds to buffer each notification event type before one digest goes
+# out; types not listed here are sent one message per event
+NOTIFICATION_DIGEST_WINDOWS = {
+    "borrowing_created": 60,
+    "borrowing_returned": 60,
+    "payment_paid": 60,
+}
+# A digest goes out early once this many events are buffered
+NOTIFICATION_DIGEST_MAX_EVENTS = 50
+# Days sent and merged outbox messages are kept; failed ones stay
+OUTBOX_RETENTION_DAYS = int(os.environ.get("OUTBOX_RETENTION_DAYS", 7))
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -104,6 +176,37 @@ else:
         }
     }
 
+# Cache
+# Redis is shared by every web and Celery process, so a cache version
+# bumped by one of them is seen by all
+
+if DJANGO_ENV == "production":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_CACHE_URL", "redis://redis:6379/1"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+BOOK_CACHE_TTL = int(os.environ.get("BOOK_CACHE_TTL", 300))
+
+# Throttle state is shared through Redis in production; without a URL
+# every process enforces the rates on its own
+if DJANGO_ENV == "production":
+    THROTTLE_REDIS_URL = os.environ.get(
+        "THROTTLE_REDIS_URL", "redis://redis:6379/2"
+    )
+else:
+    THROTTLE_REDIS_URL = os.environ.get("THROTTLE_REDIS_URL")
+# Seconds to wait for Redis before letting the request through unthrottled
+THROTTLE_REDIS_TIMEOUT = 0.1
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -145,21 +248,36 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "library_service.throttling.AnonGCRAThrottle",
+        "library_service.throttling.UserGCRAThrottle",
+        "library_service.throttling.ScopedGCRAThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
+    # "<throttle_scope>.<action>" overrides the rate of the view's scope
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "1000/day",
+        "books": "120/min",
+        "borrowings": "60/min",
+        "borrowings.create": "10/min",
+        "borrowings.return_book": "10/min",
+        "payments": "60/min",
+        "payment_sessions": "10/min",
+        "register": "10/hour",
+    },
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 5,
 }
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=1440),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenClaimsSerializer",
 }
+# Seconds a user's active/staff flags are trusted without a DB lookup
+AUTH_STATE_CACHE_TTL = 300
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Book library API",
@@ -189,5 +307,13 @@ CELERY_BEAT_SCHEDULE = {
         "task": "payment.tasks.check_session_for_expiration",
         "schedule": timedelta(days=1),
     },
+    "dispatcher_of_notifications": {
+        "task": "tg_notifications.tasks.dispatch_outbox",
+        "schedule": timedelta(seconds=15),
+    },
+    "purger_of_notifications": {
+        "task": "tg_notifications.tasks.purge_outbox",
+        "schedule": timedelta(days=1),
+    },
 
 }
@@ -0,0 +1,186 @@
+"""
+GCRA (generic cell rate algorithm) throttles shared by every process.
+
+A rate of "N/period" admits a request every `period / N` seconds with
+bursts of up to N, like a sliding window, but only one timestamp is kept
+per client: the theoretical arrival time (TAT) of its next request. With
+`THROTTLE_REDIS_URL` set, the TAT lives in Redis and is checked and moved
+by one Lua script, so the limit holds across workers and nodes. Without
+it, as in development and tests, each process keeps its own TATs.
+"""
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.settings import api_settings
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+from library_service.metrics import THROTTLED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: TAT key. ARGV: emission interval and burst tolerance in ms.
+# Returns 0 when the request is allowed, otherwise the ms to wait.
+# The Redis clock is used so that nodes with skewed clocks agree.
+GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local time = redis.call("TIME")
+local now = time[1] * 1000 + math.floor(time[2] / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call("GET", KEYS[1])) or now, now)
+if tat - tolerance > now then
+    return tat - tolerance - now
+end
+redis.call("SET", KEYS[1], tat + interval, "PX", tat + interval - now)
+return 0
+"""
+
+
+class LocalGCRAStore:
+    """TATs in process memory, for a single process or development."""
+
+    # Expired TATs are dropped once this many clients are tracked
+    max_keys = 100_000
+
+    def __init__(self):
+        self.tats = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, key: str, interval: float, tolerance: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            tat = max(self.tats.get(key, now), now)
+            if tat - tolerance > now:
+                return tat - tolerance - now
+            self.tats[key] = tat + interval
+            if len(self.tats) > self.max_keys:
+                self.tats = {
+                    key: tat for key, tat in self.tats.items() if tat > now
+                }
+            return 0.0
+
+
+class RedisGCRAStore:
+    """TATs in Redis, checked and updated atomically by `GCRA_SCRIPT`."""
+
+    def __init__(self, url: str):
+        self.client = redis.Redis.from_url(
+            url,
+            socket_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+            socket_connect_timeout=settings.THROTTLE_REDIS_TIMEOUT,
+        )
+        self.script = self.client.register_script(GCRA_SCRIPT)
+
+    def acquire(self, key: str, interval: float, tolerance: float) -> float:
+        wait = self.script(
+            keys=[key],
+            args=[max(round(interval * 1000), 1), round(tolerance * 1000)],
+        )
+        return wait / 1000
+
+
+@lru_cache(maxsize=None)
+def get_store():
+    if settings.THROTTLE_REDIS_URL:
+        return RedisGCRAStore(settings.THROTTLE_REDIS_URL)
+    return LocalGCRAStore()
+
+
+@receiver(setting_changed)
+def reset_store(*, setting, **kwargs):
+    if setting.startswith("THROTTLE_"):
+        get_store.cache_clear()
+
+
+class GCRARateThrottle(SimpleRateThrottle):
+    """
+    `SimpleRateThrottle` on the GCRA store instead of a request history
+    list in the cache. Rates use DRF's "N/period" format and are read
+    from `DEFAULT_THROTTLE_RATES` on every request.
+
+    If Redis is unreachable the request is let through: throttling must
+    not take the API down with it.
+    """
+
+    retry_after = None
+
+    @property
+    def THROTTLE_RATES(self):
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        interval = self.duration / self.num_requests
+        try:
+            self.retry_after = get_store().acquire(
+                self.key, interval, self.duration - interval
+            )
+        except redis.RedisError as error:
+            logger.warning("Throttle store unavailable: %s", error)
+            return True
+        if self.retry_after:
+            THROTTLED_REQUESTS.labels(self.scope).inc()
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonGCRAThrottle(GCRARateThrottle, AnonRateThrottle):
+    """The "anon" rate for anonymous clients, by IP address."""
+
+
+class UserGCRAThrottle(GCRARateThrottle, UserRateThrottle):
+    """The "user" rate per user, or per IP address when anonymous."""
+
+
+class ScopedGCRAThrottle(GCRARateThrottle):
+    """
+    Per-view rates. A view names its `throttle_scope` and the rate comes
+    from "<scope>.<action>", e.g. "borrowings.create", or else "<scope>".
+    Views without a scope, or scopes without a rate, are not limited.
+    """
+
+    scope_attr = "throttle_scope"
+
+    def __init__(self):
+        # The rate depends on the view, so it is resolved per request
+        pass
+
+    def allow_request(self, request, view):
+        scope = getattr(view, self.scope_attr, None)
+        if not scope:
+            return True
+        action = getattr(view, "action", None)
+        scopes = (f"{scope}.{action}", scope) if action else (scope,)
+        rates = self.THROTTLE_RATES
+        self.scope = next((name for name in scopes if name in rates), None)
+        if self.scope is None:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .metrics import EXTERNAL_CALL_LATENCY
+
+_timings: ContextVar = ContextVar("external_timings", default=None)
+
+
+@contextmanager
+def collect():
+    """Gather the `track()` durations of the enclosed block, in seconds."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def track(name: str):
+    """
+    Time an outbound call such as Stripe or Telegram.
+
+    Every call is observed in the external call latency histogram, and
+    durations add up per `name` for the enclosing `collect()`, if any.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        EXTERNAL_CALL_LATENCY.labels(name).observe(duration)
+        timings = _timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + duration
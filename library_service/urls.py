@@ -20,10 +20,12 @@ from drf_spectacular.views import (
     SpectacularRedocView,
     SpectacularSwaggerView
 )
+from .views import metrics_view
 
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("api/books/", include("book.urls", namespace="books")),
     path("api/borrowings/", include("borrowing.urls", namespace="borrowings")),
     path("api/payments/", include("payment.urls", namespace="payments")),
@@ -0,0 +1,37 @@
+"""
+Version counters for data that is cached or validated as a whole.
+
+A write bumps the counter instead of deleting keys, so every cache entry
+and ETag derived from the old version is skipped at once. The version is
+the time of the last bump in nanoseconds, which doubles as the
+Last-Modified date of the data it covers.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def get_version(key: str) -> int:
+    version = cache.get(key)
+    if version is None:
+        # A clock-based start never reuses the version of an evicted key
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> None:
+    # Kept increasing even when this host's clock is behind the last writer
+    version = max(time.time_ns(), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+
+
+def invalidate(key: str) -> None:
+    """
+    Bump `key` now and again on commit. The immediate bump keeps the
+    writer's own reads fresh, and the bump on commit drops what other
+    requests derived from the old rows while the transaction was open.
+    """
+    bump_version(key)
+    transaction.on_commit(lambda: bump_version(key))
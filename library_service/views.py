@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .metrics import render
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if not token and settings.DJANGO_ENV == "production":
+        # Traffic and business gauges are never public in production
+        return HttpResponse(status=403)
+    if token and not constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+    body, content_type = render()
+    return HttpResponse(body, content_type=content_type)
@@ -1,6 +1,16 @@
 from datetime import date
 from decimal import Decimal
 
+from django.db.models import (
+    DateField,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Func,
+    IntegerField,
+    Value,
+)
+
 FINE_MULTIPLIER = Decimal("2.0")
 
 
@@ -29,3 +39,45 @@ def calculate_fine(
     if days_late > 0:
         fine += Decimal(days_late) * (Decimal(book_daily_fee) * FINE_MULTIPLIER)
     return round(fine, 2)
+
+
+class DaysBetween(Func):
+    """Whole days from `start` to `end`, computed by the database."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            function="DATEDIFF",
+            template="%(function)s(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context,
+        )
+
+
+def fine_expression(overdue: date, daily_fee="book__daily_fee"):
+    """Database-side equivalent of `calculate_fine` for overdue borrowings."""
+    days_late = DaysBetween(
+        Value(overdue, output_field=DateField()),
+        F("expected_return_date"),
+    )
+    return ExpressionWrapper(
+        days_late * F(daily_fee) * Value(FINE_MULTIPLIER),
+        output_field=DecimalField(max_digits=9, decimal_places=2),
+    )
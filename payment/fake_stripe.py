@@ -0,0 +1,130 @@
+"""
+Local stand-ins for Stripe, used by tests and benchmarks.
+
+`FakeStripeGateway` is a drop-in `STRIPE_BACKEND` that keeps checkout
+sessions in memory and sleeps `STRIPE_FAKE_LATENCY_MS` per call, without
+blocking the event loop in its async methods.
+`checkout_session_event()` builds the webhook events Stripe sends for
+checkout sessions and `sign_payload()` signs them the way Stripe does,
+so they pass `stripe.Webhook.construct_event` with the same secret.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+import uuid
+
+import stripe
+from django.conf import settings
+
+from library_service.timing import track
+
+
+class FakeStripeGateway:
+
+    def __init__(self):
+        self.latency = settings.STRIPE_FAKE_LATENCY_MS / 1000
+        self.sessions = {}
+        self.idempotency_keys = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _count(self):
+        with self.lock:
+            self.calls += 1
+
+    def _call(self):
+        self._count()
+        if self.latency:
+            with track("stripe"):
+                time.sleep(self.latency)
+
+    async def _acall(self):
+        self._count()
+        if self.latency:
+            with track("stripe"):
+                await asyncio.sleep(self.latency)
+
+    def create_checkout_session(self, params: dict, idempotency_key: str):
+        self._call()
+        with self.lock:
+            if idempotency_key in self.idempotency_keys:
+                return self.idempotency_keys[idempotency_key]
+            session_id = f"cs_fake_{uuid.uuid4().hex}"
+            session = stripe.checkout.Session.construct_from(
+                {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    "url": f"https://checkout.stripe.test/{session_id}",
+                    "status": "open",
+                    "payment_status": "unpaid",
+                    "amount_total": params["line_items"][0]["price_data"][
+                        "unit_amount"
+                    ],
+                },
+                "sk_fake",
+            )
+            self.sessions[session_id] = session
+            self.idempotency_keys[idempotency_key] = session
+        return session
+
+    def retrieve_checkout_session(self, session_id: str):
+        self._call()
+        return self._session(session_id)
+
+    async def aretrieve_checkout_session(self, session_id: str):
+        await self._acall()
+        return self._session(session_id)
+
+    def _session(self, session_id: str):
+        try:
+            return self.sessions[session_id]
+        except KeyError:
+            raise stripe.error.InvalidRequestError(
+                f"No such checkout.session: '{session_id}'", "session"
+            )
+
+    def complete(self, session_id: str):
+        self.sessions[session_id].update(
+            {"status": "complete", "payment_status": "paid"}
+        )
+
+    def expire(self, session_id: str):
+        self.sessions[session_id].update({"status": "expired"})
+
+
+def checkout_session_event(
+        session_id: str,
+        event_type: str = "checkout.session.completed",
+        payment_status: str = "paid",
+) -> dict:
+    status = "expired" if event_type == "checkout.session.expired" else "complete"
+    return {
+        "id": f"evt_{uuid.uuid4().hex}",
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {
+            "object": {
+                "id": session_id,
+                "object": "checkout.session",
+                "status": status,
+                "payment_status": payment_status,
+            }
+        },
+    }
+
+
+def sign_payload(payload: bytes, secret: str, timestamp: int = None) -> str:
+    """Return a `Stripe-Signature` header value for `payload`."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    signature = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def signed_event(event: dict, secret: str) -> tuple[bytes, str]:
+    payload = json.dumps(event).encode()
+    return payload, sign_payload(payload, secret)
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+from weakref import WeakKeyDictionary
+
+import requests
+import stripe
+from asgiref.sync import AsyncToSync, sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+from library_service.timing import track
+
+
+class StripeGateway:
+    """
+    The one place that talks to Stripe.
+
+    A single `StripeClient` shares a keep-alive `requests.Session`, so
+    checkouts reuse TLS connections instead of opening one per call.
+    Timeouts are bounded and the SDK retries connection errors, 409s and
+    5xx responses with jittered exponential backoff; the idempotency keys
+    passed on create make those retries safe.
+
+    Async views use `aretrieve_checkout_session()`, which goes through an
+    httpx-based client instead and does not block a thread. Under WSGI
+    each async view runs on a loop of its own, which would leave a new
+    httpx pool behind per request, so there it uses the pooled sync
+    client from a thread instead.
+    """
+
+    def __init__(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.STRIPE_POOL_SIZE,
+            pool_maxsize=settings.STRIPE_POOL_SIZE,
+        )
+        session.mount("https://", adapter)
+        self.client = stripe.StripeClient(
+            settings.STRIPE_SECRET_KEY or "",
+            http_client=stripe.RequestsClient(
+                timeout=settings.STRIPE_TIMEOUT, session=session
+            ),
+            max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+        )
+        self.async_clients = WeakKeyDictionary()
+
+    def async_client(self, loop) -> stripe.StripeClient:
+        # httpx's async pool belongs to the event loop that opened it, so
+        # each long-lived loop, one per ASGI worker, gets its own client
+        client = self.async_clients.get(loop)
+        if client is None:
+            client = self.async_clients[loop] = stripe.StripeClient(
+                settings.STRIPE_SECRET_KEY or "",
+                http_client=stripe.HTTPXClient(timeout=settings.STRIPE_TIMEOUT),
+                max_network_retries=settings.STRIPE_MAX_NETWORK_RETRIES,
+            )
+        return client
+
+    def create_checkout_session(self, params: dict, idempotency_key: str):
+        with track("stripe"):
+            return self.client.checkout.sessions.create(
+                params, options={"idempotency_key": idempotency_key}
+            )
+
+    def retrieve_checkout_session(self, session_id: str):
+        with track("stripe"):
+            return self.client.checkout.sessions.retrieve(session_id)
+
+    async def aretrieve_checkout_session(self, session_id: str):
+        loop = asyncio.get_running_loop()
+        if loop in AsyncToSync.loop_thread_executors:
+            # A loop async_to_sync() opened for this call only
+            return await sync_to_async(self.retrieve_checkout_session)(
+                session_id
+            )
+        with track("stripe"):
+            client = self.async_client(loop)
+            return await client.checkout.sessions.retrieve_async(session_id)
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Return the process-wide gateway for `settings.STRIPE_BACKEND`."""
+    global _gateway
+    gateway = _gateway
+    if gateway is None:
+        # Concurrent first calls must not each build their own gateway
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = import_string(settings.STRIPE_BACKEND)()
+            gateway = _gateway
+    return gateway
+
+
+@receiver(setting_changed)
+def reset_gateway(*, setting, **kwargs):
+    global _gateway
+    if setting.startswith("STRIPE_"):
+        with _gateway_lock:
+            _gateway = None
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+def blank_session_ids_to_null(apps, schema_editor):
+    # Several "" values would collide on the new unique constraint
+    Payment = apps.get_model("payment", "Payment")
+    Payment.objects.filter(session_id="").update(session_id=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payment", "0004_alter_payment_session_url"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            blank_session_ids_to_null, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="session_id",
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["status", "borrowing"], name="payment_status_borrowing_idx"
+            ),
+        ),
+    ]
@@ -3,6 +3,14 @@ from borrowing.models import Borrowing
 
 
 class Payment(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "borrowing"],
+                name="payment_status_borrowing_idx"
+            ),
+        ]
+
     class Status(models.TextChoices):
         PENDING = ("Pending", "pending")
         PAID = ("Paid", "paid")
@@ -20,5 +28,11 @@ class Payment(models.Model):
         related_name="payments"
     )
     session_url = models.URLField(max_length=500, null=True, blank=True)
-    session_id = models.TextField(max_length=63, null=True, blank=True)
+    session_id = models.CharField(
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True
+    )
     money_to_pay = models.DecimalField(max_digits=5, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
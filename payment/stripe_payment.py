@@ -1,10 +1,11 @@
-import os
-import stripe
-from django.http import JsonResponse
 from django.db import transaction
 from django.conf import settings
 from django.urls import reverse
-from dotenv import load_dotenv
+from django.utils import timezone
+from borrowing.cache import invalidate_borrowings
+from tg_notifications.models import OutboxMessage
+from tg_notifications.notifications import queue_message, queue_messages
+from .gateway import get_gateway
 from .models import Payment
 from .calculations import (
     calculate_borrowing_amount,
@@ -12,50 +13,81 @@ from .calculations import (
     calculate_fine
 )
 
-load_dotenv()
 
-stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+def payment_idempotency_key(payment) -> str:
+    # Renewals add new payments to the same borrowing, so the payment id
+    # keeps their sessions apart while retries of one payment collapse
+    return f"payment-{payment.borrowing_id}-{payment.type.lower()}-{payment.id}"
 
 
-@transaction.atomic()
-def create_payment_session(borrowing, amount, payment_type):
-    checkout_session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
-            {
-                "price_data": {
-                    "currency": "usd",
-                    "unit_amount": int(amount * 100),
-                    "product_data": {
-                        "name": borrowing.book.title,
+def create_payment_session(payment):
+    """
+    Open a Stripe checkout session for a PENDING `payment` and store it.
+
+    Runs outside any request transaction: the HTTP call to Stripe must not
+    keep the book's inventory row locked. Payments that already have a
+    session or are no longer pending are left untouched.
+    """
+    if payment.session_id or payment.status != Payment.Status.PENDING:
+        return payment
+
+    checkout_session = get_gateway().create_checkout_session(
+        {
+            "payment_method_types": ["card"],
+            "line_items": [
+                {
+                    "price_data": {
+                        "currency": "usd",
+                        "unit_amount": int(payment.money_to_pay * 100),
+                        "product_data": {
+                            "name": payment.borrowing.book.title,
+                        },
                     },
-                },
-                "quantity": 1,
-            }
-        ],
-        mode="payment",
-        success_url=settings.BASE_URL
-        + reverse("payments:payment-success")
-        + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=settings.BASE_URL + reverse("payments:payment-cancel"),
+                    "quantity": 1,
+                }
+            ],
+            "mode": "payment",
+            "success_url": settings.BASE_URL
+            + reverse("payments:payment-success")
+            + "?session_id={CHECKOUT_SESSION_ID}",
+            "cancel_url": settings.BASE_URL + reverse("payments:payment-cancel"),
+        },
+        idempotency_key=payment_idempotency_key(payment),
+    )
+
+    payment.session_id = checkout_session.id
+    payment.session_url = checkout_session.url
+    Payment.objects.filter(
+        id=payment.id, session_id__isnull=True
+    ).update(
+        session_id=payment.session_id,
+        session_url=payment.session_url,
+        updated_at=timezone.now(),
     )
+    invalidate_borrowings()
+    return payment
+
 
-    session_id = checkout_session.id
-    session_url = checkout_session.url
+def create_pending_payment(borrowing, amount, payment_type):
+    """
+    Store a PENDING payment and open its Stripe session once the
+    surrounding transaction commits. Clients poll
+    `/api/payments/<id>/session/` for the checkout URL.
+    """
+    from .tasks import open_checkout_session
 
-    Payment.objects.create(
+    payment = Payment.objects.create(
         status=Payment.Status.PENDING,
         type=payment_type,
         borrowing=borrowing,
-        session_url=session_url,
-        session_id=session_id,
         money_to_pay=amount,
     )
-
-    return JsonResponse({"id": checkout_session.id})
+    transaction.on_commit(
+        lambda: open_checkout_session.delay(payment.id), robust=True
+    )
+    return payment
 
 
-@transaction.atomic()
 def create_checkout_session(borrowing):
     days_of_borrow = borrow_days(
         borrowing.borrow_date,
@@ -65,14 +97,109 @@ def create_checkout_session(borrowing):
         days_of_borrow,
         borrowing.book.daily_fee
     )
-    return create_payment_session(borrowing, total_price, Payment.Type.PAYMENT)
+    return create_pending_payment(borrowing, total_price, Payment.Type.PAYMENT)
 
 
-@transaction.atomic()
 def create_fine_payment(borrowing):
     fine = calculate_fine(
         borrowing.expected_return_date,
         borrowing.actual_return_date,
         borrowing.book.daily_fee,
     )
-    return create_payment_session(borrowing, fine, Payment.Type.FINE)
+    return create_pending_payment(borrowing, fine, Payment.Type.FINE)
+
+
+def payment_paid_message(payment) -> str:
+    borrowing = payment.borrowing
+    if payment.type == Payment.Type.FINE:
+        return (
+            f"User {borrowing.user.email} has successfully paid "
+            f"{payment.money_to_pay}$ fine"
+            f" for late return of the book from borrowing ID: {borrowing.id} "
+        )
+    return (
+        f"User {borrowing.user.email} "
+        f"has paid {payment.money_to_pay}$ "
+        f"for borrowing a book:\n"
+        f"Title: {borrowing.book.title},"
+        f"cover({borrowing.book.cover})\n"
+        f"Author: {borrowing.book.author}\n"
+        f"Expected return date: {borrowing.expected_return_date}"
+    )
+
+
+def payment_paid_summary(payment) -> str:
+    borrowing = payment.borrowing
+    return (
+        f"#{payment.id} {borrowing.user.email} | "
+        f"{payment.type.lower()} {payment.money_to_pay}$ | "
+        f"{borrowing.book.title} (borrowing #{borrowing.id})"
+    )
+
+
+@transaction.atomic()
+def mark_session_paid(session_id: str):
+    """
+    Flip the PENDING payment for `session_id` to PAID and notify staff.
+
+    The conditional UPDATE makes this idempotent: Stripe retries webhooks
+    and the success redirect may race them, but only the first caller
+    changes the row and queues the message. Returns the payment or None.
+    """
+    updated = Payment.objects.filter(
+        session_id=session_id, status=Payment.Status.PENDING
+    ).update(status=Payment.Status.PAID, updated_at=timezone.now())
+    if not updated:
+        return None
+    invalidate_borrowings()
+    payment = Payment.objects.select_related(
+        "borrowing__book", "borrowing__user"
+    ).get(session_id=session_id)
+    queue_message(
+        payment_paid_message(payment),
+        OutboxMessage.EventType.PAYMENT_PAID,
+        payment_paid_summary(payment),
+    )
+    return payment
+
+
+def mark_session_expired(session_id: str) -> bool:
+    expired = bool(
+        Payment.objects.filter(
+            session_id=session_id, status=Payment.Status.PENDING
+        ).update(status=Payment.Status.EXPIRED, updated_at=timezone.now())
+    )
+    if expired:
+        invalidate_borrowings()
+    return expired
+
+
+@transaction.atomic()
+def mark_payments_paid(payment_ids: list[int]) -> int:
+    """Batch `mark_session_paid`: one SELECT, one UPDATE, one outbox insert."""
+    payments = list(
+        Payment.objects.select_for_update(of=("self",))
+        .select_related("borrowing__book", "borrowing__user")
+        .filter(id__in=payment_ids, status=Payment.Status.PENDING)
+    )
+    if not payments:
+        return 0
+    Payment.objects.filter(
+        id__in=[payment.id for payment in payments]
+    ).update(status=Payment.Status.PAID, updated_at=timezone.now())
+    invalidate_borrowings()
+    queue_messages(
+        [payment_paid_message(payment) for payment in payments],
+        OutboxMessage.EventType.PAYMENT_PAID,
+        [payment_paid_summary(payment) for payment in payments],
+    )
+    return len(payments)
+
+
+def mark_payments_expired(payment_ids: list[int]) -> int:
+    expired = Payment.objects.filter(
+        id__in=payment_ids, status=Payment.Status.PENDING
+    ).update(status=Payment.Status.EXPIRED, updated_at=timezone.now())
+    if expired:
+        invalidate_borrowings()
+    return expired
@@ -1,29 +1,120 @@
-import os
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 import stripe
 from celery import shared_task
-from dotenv import load_dotenv
-from tg_notifications.notifications import send_message
+from tg_notifications.notifications import queue_message
+from .gateway import get_gateway
 from .models import Payment
+from .stripe_payment import (
+    create_payment_session,
+    mark_payments_expired,
+    mark_payments_paid,
+)
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_BATCH_SIZE = 200
+# Parallel Stripe lookups; keep it within STRIPE_POOL_SIZE so every
+# worker gets a pooled keep-alive connection
+RECONCILE_CONCURRENCY = 10
+
+
+@shared_task(
+    autoretry_for=(
+        stripe.error.APIConnectionError,
+        stripe.error.RateLimitError,
+        stripe.error.APIError,
+    ),
+    retry_backoff=True,
+    max_retries=5,
+)
+def open_checkout_session(payment_id: int):
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(id=payment_id)
+        .first()
+    )
+    if payment is None:
+        return None
+    return create_payment_session(payment).session_id
+
 
-load_dotenv()
+def fetch_session_state(session_id: str):
+    try:
+        stripe_session = get_gateway().retrieve_checkout_session(session_id)
+    except stripe.error.StripeError as error:
+        logger.warning("Cannot retrieve session %s: %s", session_id, error)
+        return None
+    if stripe_session.status == "expired":
+        return Payment.Status.EXPIRED
+    if stripe_session.payment_status == "paid":
+        return Payment.Status.PAID
+    return Payment.Status.PENDING
 
 
 @shared_task()
-def check_session_for_expiration():
-    stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+def check_session_for_expiration(concurrency: int = RECONCILE_CONCURRENCY):
+    """
+    Reconcile PENDING payments whose webhook never arrived.
 
-    pending_payments = Payment.objects.filter(status=Payment.Status.PENDING)
-    expired_found = False
+    The Stripe webhook settles almost every session as it happens, so
+    this daily sweep only sees the leftovers. Sessions are looked up
+    `concurrency` at a time and each batch is applied with one UPDATE
+    per status, guarded by status=PENDING so it cannot override the
+    webhook. Payments whose session was never opened (e.g. the broker
+    was down at commit time) are queued for `open_checkout_session` again.
+    """
+    started = time.perf_counter()
+    missing_sessions = Payment.objects.filter(
+        status=Payment.Status.PENDING, session_id__isnull=True
+    ).values_list("id", flat=True)
+    for payment_id in missing_sessions.iterator():
+        open_checkout_session.delay(payment_id)
 
-    for payment in pending_payments:
-        stripe_session = stripe.checkout.Session.retrieve(payment.session_id)
-        if stripe_session.payment_status == "expired":
-            payment.status = payment.Status.EXPIRED
-            payment.save()
-            message = f"Found expired session: SESSION_ID {payment.id}"
-            expired_found = True
-            send_message(message)
+    pending = (
+        Payment.objects.filter(
+            status=Payment.Status.PENDING, session_id__isnull=False
+        )
+        .order_by("id")
+        .values_list("id", "session_id")
+        .iterator(chunk_size=RECONCILE_BATCH_SIZE)
+    )
+    checked = expired = paid = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while batch := list(islice(pending, RECONCILE_BATCH_SIZE)):
+            payment_ids, session_ids = zip(*batch)
+            states = executor.map(fetch_session_state, session_ids)
+            settled = {Payment.Status.EXPIRED: [], Payment.Status.PAID: []}
+            for payment_id, state in zip(payment_ids, states):
+                checked += state is not None
+                if state in settled:
+                    settled[state].append(payment_id)
+            expired += mark_payments_expired(settled[Payment.Status.EXPIRED])
+            paid += mark_payments_paid(settled[Payment.Status.PAID])
 
-    if not expired_found:
-        send_message("No expired sessions found!")
+    runtime = time.perf_counter() - started
+    sessions_per_sec = round(checked / runtime, 1) if runtime else 0.0
+    if expired or paid:
+        queue_message(
+            f"Payment reconciliation: {expired} expired, {paid} paid "
+            f"out of {checked} pending sessions"
+        )
+    else:
+        queue_message("No expired sessions found!")
 
+    logger.info(
+        "Payment reconciliation: %s sessions in %.3fs (%s sessions/sec)",
+        checked,
+        runtime,
+        sessions_per_sec,
+    )
+    return {
+        "checked": checked,
+        "expired": expired,
+        "paid": paid,
+        "runtime_s": round(runtime, 3),
+        "sessions_per_sec": sessions_per_sec,
+    }
@@ -5,6 +5,7 @@ from .views import (
     PaymentSuccessView,
     PaymentCancelView,
     PaymentRenewView,
+    StripeWebhookView,
 )
 
 router = routers.DefaultRouter()
@@ -13,6 +14,7 @@ urlpatterns = [
     path("success/", PaymentSuccessView.as_view(), name="payment-success"),
     path("cancel/", PaymentCancelView.as_view(), name="payment-cancel"),
     path("renew/", PaymentRenewView.as_view(), name="payment-renew"),
+    path("webhook/", StripeWebhookView.as_view(), name="payment-webhook"),
     path("", include(router.urls)),
 ]
 
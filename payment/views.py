@@ -1,30 +1,46 @@
-import os
 import stripe
-from django.db import transaction
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
-from dotenv import load_dotenv
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from drf_spectacular.utils import (
     extend_schema_view,
-    extend_schema
+    extend_schema,
+    OpenApiParameter,
 )
-from tg_notifications.notifications import send_message
+from library_service.async_views import AsyncAPIView
+from library_service.export import export_response, get_export_format
+from library_service.pagination import KeysetPagination
+from .gateway import get_gateway
 from .models import Payment
 from .serializers import (
     PaymentSerializer,
     PaymentListSerializer,
     PaymentRetrieveSerializer,
 )
-from .stripe_payment import create_checkout_session
-from .calculations import (
-    calculate_borrowing_amount,
-    borrow_days
+from .stripe_payment import (
+    create_checkout_session,
+    mark_session_expired,
+    mark_session_paid,
 )
 
-load_dotenv()
+PAYMENT_EXPORT_FIELDS = {
+    "id": "id",
+    "status": "status",
+    "type": "type",
+    "borrowing_id": "borrowing_id",
+    "user_email": "borrowing__user__email",
+    "money_to_pay": "money_to_pay",
+    "session_id": "session_id",
+}
+PAID_SESSION_EVENTS = (
+    "checkout.session.completed",
+    "checkout.session.async_payment_succeeded",
+)
 
 
 @extend_schema_view(
@@ -53,13 +69,17 @@ class PaymentViewSet(ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    throttle_scope = "payments"
 
     def get_queryset(self):
         queryset = self.queryset
         if not self.request.user.is_staff:
             queryset = self.queryset.filter(borrowing__user=self.request.user)
-        if self.action in ("list", "retrieve"):
-            return queryset.select_related("borrowing")
+        if self.action == "list":
+            return queryset.select_related("borrowing__user")
+        if self.action == "retrieve":
+            return queryset.select_related("borrowing__user", "borrowing__book")
         return queryset
 
     def get_serializer_class(self):
@@ -69,54 +89,109 @@ class PaymentViewSet(ModelViewSet):
             return PaymentRetrieveSerializer
         return PaymentSerializer
 
+    @extend_schema(
+        summary="Poll checkout session of a payment",
+        description="Authenticated user can poll own payment until its "
+                    "Stripe checkout session is ready. Returns 202 while "
+                    "the session is still being created.",
+    )
+    @action(methods=["GET"], detail=True, url_path="session")
+    def session(self, request, pk=None):
+        payment = self.get_object()
+        pending = (
+            payment.status == Payment.Status.PENDING
+            and not payment.session_url
+        )
+        return Response(
+            {
+                "id": payment.id,
+                "status": payment.status,
+                "session_id": payment.session_id,
+                "session_url": payment.session_url,
+            },
+            status=status.HTTP_202_ACCEPTED if pending else status.HTTP_200_OK,
+        )
+
+    @extend_schema(
+        summary="Export payments",
+        description="Authenticated user can download own payments, "
+                    "admin can download all of them, as a streamed "
+                    "CSV or NDJSON file",
+        parameters=[
+            OpenApiParameter(
+                name="export_format",
+                description="File format: csv (default) or ndjson",
+                type=str,
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, url_path="export")
+    def export(self, request):
+        return export_response(
+            request,
+            self.get_queryset(),
+            PAYMENT_EXPORT_FIELDS,
+            get_export_format(request),
+            "payments",
+        )
+
+
+class PaymentSuccessView(AsyncAPIView):
+    throttle_scope = "payment_sessions"
 
-class PaymentSuccessView(APIView):
     @extend_schema(
         summary="Get info about successful payment",
         description="Authenticated user can get info about successful payment and system changes payment status",
     )
-    @transaction.atomic()
-    def get(self, request, *args, **kwargs):
-        stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+    async def get(self, request, *args, **kwargs):
         session_id = self.request.query_params.get("session_id")
 
-        retrieve_session = stripe.checkout.Session.retrieve(session_id)
+        retrieve_session = await get_gateway().aretrieve_checkout_session(
+            session_id
+        )
         if retrieve_session.payment_status == "paid":
-            payment = Payment.objects.get(session_id=session_id)
-            if payment:
-                payment.status = payment.Status.PAID
-                payment.save()
-            if payment.type == Payment.Type.PAYMENT:
-                days_of_borrow = borrow_days(
-                    payment.borrowing.borrow_date,
-                    payment.borrowing.expected_return_date,
-                )
-                total_amount = calculate_borrowing_amount(
-                    days_of_borrow, payment.borrowing.book.daily_fee
-                )
-                message = (
-                    f"User {payment.borrowing.user.email} "
-                    f"has paid {total_amount}$ "
-                    f"for borrowing a book:\n"
-                    f"Title: {payment.borrowing.book.title},"
-                    f"cover({payment.borrowing.book.cover})\n"
-                    f"Author: {payment.borrowing.book.author}\n"
-                    f"Expected return date: {payment.borrowing.expected_return_date}"
-                )
-                send_message(message)
-            elif payment.type == Payment.Type.FINE:
-                fine = payment.money_to_pay
-                fine_message = (
-                    f"User {payment.borrowing.user.email} has successfully paid {fine}$ fine"
-                    f" for late return of the book from borrowing ID: {payment.borrowing.id} "
-                )
-                send_message(fine_message)
+            await sync_to_async(mark_session_paid)(session_id)
 
         return Response({"status": "Payment successful."}, status=status.HTTP_200_OK)
 
 
+class StripeWebhookView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+    @extend_schema(exclude=True)
+    def post(self, request, *args, **kwargs):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            return Response(
+                {"detail": "Stripe webhook secret is not configured"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.META.get("HTTP_STRIPE_SIGNATURE", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"detail": "Invalid payload or signature"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        session = event["data"]["object"]
+        if event["type"] in PAID_SESSION_EVENTS:
+            if session.get("payment_status") == "paid":
+                mark_session_paid(session["id"])
+        elif event["type"] == "checkout.session.expired":
+            mark_session_expired(session["id"])
+
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
+
 class PaymentCancelView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = "payment_sessions"
 
     @extend_schema(
         summary="Get info about canceled payment",
@@ -134,6 +209,7 @@ class PaymentCancelView(APIView):
 
 class PaymentRenewView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_scope = "payment_sessions"
 
     @extend_schema(
         summary="Renew payment",
@@ -144,9 +220,12 @@ class PaymentRenewView(APIView):
             status=Payment.Status.EXPIRED, borrowing__user=self.request.user
         ).first()
         if payment:
-            create_checkout_session(payment.borrowing)
+            renewed = create_checkout_session(payment.borrowing)
             return Response(
-                {"status": "Your payment has successfully renewed"},
+                {
+                    "status": "Your payment has successfully renewed",
+                    "payment_id": renewed.id,
+                },
                 status=status.HTTP_200_OK,
             )
         return Response(
@@ -1,4 +1,11 @@
+import io
+import tempfile
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db.models import F
 from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
@@ -7,6 +14,8 @@ from book.models import Book
 from book.serializers import BookRetrieveSerializer
 
 BOOK_URL = reverse("books:book-list")
+SEARCH_URL = reverse("books:book-search")
+IMPORT_URL = reverse("books:book-import-books")
 
 
 def detail_url(book_id: int) -> str:
@@ -35,6 +44,39 @@ class UnauthenticatedBookApiTest(TestCase):
         res = self.client.get(detail_url(self.book_1.id))
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_search_books(self) -> None:
+        dune = Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=0.5
+        )
+        Book.objects.create(
+            title="Emma",
+            author="Jane Austen",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=0.5
+        )
+        res = self.client.get(SEARCH_URL, {"q": "herb"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([book["id"] for book in res.data], [dune.id])
+
+    def test_search_index_follows_book_changes(self) -> None:
+        self.book_1.title = "Renamed title"
+        self.book_1.save()
+        res = self.client.get(SEARCH_URL, {"q": "renamed"})
+        self.assertEqual([book["id"] for book in res.data], [self.book_1.id])
+
+        self.book_1.delete()
+        res = self.client.get(SEARCH_URL, {"q": "renamed"})
+        self.assertEqual(res.data, [])
+
+    def test_search_requires_query(self) -> None:
+        res = self.client.get(SEARCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class AuthenticatedBookApiTest(TestCase):
 
@@ -77,6 +119,11 @@ class AuthenticatedBookApiTest(TestCase):
         res = self.client.delete(detail_url(self.book_1.id))
         self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_import_books_forbidden(self) -> None:
+        upload = SimpleUploadedFile("books.csv", b"title,author\n")
+        res = self.client.post(IMPORT_URL, {"file": upload})
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
 
 class AdminBookApiTest(TestCase):
     def setUp(self) -> None:
@@ -113,3 +160,279 @@ class AdminBookApiTest(TestCase):
         res = self.client.delete(detail_url(self.book_1.id))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Book.objects.count(), 0)
+
+    def test_book_list_cursor_pagination(self) -> None:
+        for number in range(6):
+            Book.objects.create(
+                title=f"Paged book {number}",
+                author="Paged Author",
+                cover=Book.CoverType.SOFT,
+                inventory=1,
+                daily_fee=0.5
+            )
+        res = self.client.get(BOOK_URL, {"pagination": "cursor"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertIn("cursor=", res.data["next"])
+
+        next_page = self.client.get(res.data["next"])
+        self.assertEqual(len(next_page.data["results"]), 2)
+        self.assertIsNone(next_page.data["next"])
+        self.assertLess(
+            res.data["results"][-1]["id"],
+            next_page.data["results"][0]["id"]
+        )
+
+    def test_book_list_defaults_to_offset_pagination(self) -> None:
+        for number in range(6):
+            Book.objects.create(
+                title=f"Paged book {number}",
+                author="Paged Author",
+                cover=Book.CoverType.SOFT,
+                inventory=1,
+                daily_fee=0.5
+            )
+        res = self.client.get(BOOK_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["count"], 7)
+        self.assertIn("offset=5", res.data["next"])
+
+        res = self.client.get(res.data["next"])
+        self.assertEqual(len(res.data["results"]), 2)
+        self.assertIsNone(res.data["next"])
+        self.assertNotIn("cursor=", res.data["previous"])
+
+        res = self.client.get(BOOK_URL, {"pagination": "cursor", "count": "true"})
+        self.assertEqual(res.data["count"], 7)
+        self.assertIn("cursor=", res.data["next"])
+
+    def test_import_books_upserts_on_natural_key(self) -> None:
+        upload = SimpleUploadedFile(
+            "books.csv",
+            b"title,author,cover,inventory,daily_fee\n"
+            b"Test book,Test Author,Hard,7,0.75\n"
+            b"Imported book,Imported Author,soft,3,1.20\n"
+            b"Broken book,Broken Author,Paper,-1,1.00\n",
+        )
+        res = self.client.post(IMPORT_URL, {"file": upload})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["updated"], 1)
+        self.assertEqual(res.data["invalid"], 1)
+        self.assertEqual(res.data["errors"][0]["row"], 3)
+        self.assertEqual(Book.objects.count(), 2)
+        self.book_1.refresh_from_db()
+        self.assertEqual(self.book_1.inventory, 7)
+
+    def test_import_updates_a_book_inserted_after_its_lookup(self) -> None:
+        upload = SimpleUploadedFile(
+            "books.csv",
+            b"title,author,cover,inventory,daily_fee\n"
+            b"Raced book,Raced Author,Soft,4,1.20\n",
+        )
+        real_filter = Book.objects.filter
+
+        def concurrent_insert(*args, **kwargs):
+            # Another import commits the same book after this one looked
+            if not Book.objects.exclude(pk=self.book_1.pk).exists():
+                Book.objects.create(
+                    title="Raced book",
+                    author="Raced Author",
+                    cover=Book.CoverType.SOFT,
+                    inventory=1,
+                    daily_fee=1,
+                )
+            return real_filter(*args, **kwargs).none()
+
+        with mock.patch.object(Book.objects, "filter", concurrent_insert):
+            res = self.client.post(IMPORT_URL, {"file": upload})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            Book.objects.filter(title="Raced book").get().inventory, 4
+        )
+
+    def test_import_rejects_non_utf8_upload_before_writing(self) -> None:
+        upload = SimpleUploadedFile(
+            "books.csv",
+            b"title,author,cover,inventory,daily_fee\n"
+            b"Imported book,Imported Author,Soft,3,1.20\n"
+            b"Caf\xe9 book,Latin-1 Author,Soft,3,1.20\n",
+        )
+        res = self.client.post(IMPORT_URL, {"file": upload})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        # Numbered like the per-row errors, without the header
+        self.assertEqual(res.data["row"], 2)
+        self.assertEqual(Book.objects.count(), 1)
+
+    def test_import_books_command(self) -> None:
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as source:
+            source.write(
+                '{"title": "Command book", "author": "Author", '
+                '"cover": "Hard", "inventory": 2, "daily_fee": "1.00"}\n'
+            )
+            source.flush()
+            call_command("import_books", source.name, stdout=io.StringIO())
+        self.assertTrue(Book.objects.filter(title="Command book").exists())
+
+    def test_import_books_command_checks_the_file_first(self) -> None:
+        with tempfile.NamedTemporaryFile("wb", suffix=".ndjson") as source:
+            source.write(
+                b'{"title": "Command book", "author": "Author", '
+                b'"cover": "Hard", "inventory": 2, "daily_fee": "1.00"}\n'
+                b"\n"
+                b'{"title": "Caf\xe9 book", "author": "Author", '
+                b'"cover": "Hard", "inventory": 2, "daily_fee": "1.00"}\n'
+            )
+            source.flush()
+            with self.assertRaisesMessage(CommandError, "Row 2: "):
+                call_command(
+                    "import_books",
+                    source.name,
+                    batch_size=1,
+                    stdout=io.StringIO(),
+                )
+        self.assertFalse(Book.objects.filter(title="Command book").exists())
+
+
+class GenerateDataCommandTest(TestCase):
+
+    def test_generate_data(self) -> None:
+        from borrowing.models import Borrowing
+        from payment.models import Payment
+
+        get_user_model().objects.create_user(email="user@test.com")
+        call_command(
+            "generate_data",
+            users=20,
+            books=10,
+            borrowings=300,
+            batch_size=64,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(get_user_model().objects.count(), 21)
+        self.assertEqual(Book.objects.count(), 10)
+        self.assertEqual(Borrowing.objects.count(), 300)
+        self.assertFalse(
+            Borrowing.objects.filter(
+                borrow_date__gte=F("expected_return_date")
+            ).exists()
+        )
+        active = Borrowing.objects.filter(actual_return_date__isnull=True)
+        self.assertTrue(active.exists())
+        self.assertEqual(
+            active.values("user", "book").distinct().count(), active.count()
+        )
+        payments = Payment.objects.filter(type=Payment.Type.PAYMENT)
+        self.assertEqual(payments.count(), 300)
+        self.assertFalse(
+            Payment.objects.filter(
+                type=Payment.Type.FINE,
+                borrowing__actual_return_date__lte=F(
+                    "borrowing__expected_return_date"
+                ),
+            ).exists()
+        )
+
+
+class BookCacheTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Cached book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+        )
+
+    def test_list_is_served_from_cache(self) -> None:
+        self.assertEqual(self.client.get(BOOK_URL)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(res.data["results"][0]["title"], "Cached book")
+        self.assertEqual(
+            self.client.get(BOOK_URL, {"limit": 1})["X-Cache"], "MISS"
+        )
+
+    def test_book_changes_invalidate_cache(self) -> None:
+        self.client.get(BOOK_URL)
+        self.book.title = "Renamed book"
+        self.book.save()
+        res = self.client.get(BOOK_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["results"][0]["title"], "Renamed book")
+
+    def test_inventory_change_keeps_catalog_cached(self) -> None:
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@test.com")
+        )
+        other = Book.objects.create(
+            title="Other book",
+            author="Test Author",
+            cover=Book.CoverType.SOFT,
+            inventory=1,
+            daily_fee=0.5
+        )
+        url = detail_url(self.book.id)
+        self.client.get(BOOK_URL)
+        self.client.get(url)
+        self.client.get(detail_url(other.id))
+
+        Book.take_copy(self.book.id)
+        self.assertEqual(self.client.get(BOOK_URL)["X-Cache"], "HIT")
+        self.assertEqual(
+            self.client.get(detail_url(other.id))["X-Cache"], "HIT"
+        )
+        res = self.client.get(url)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["inventory"], 1)
+
+    def test_detail_is_cached_per_book(self) -> None:
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@test.com")
+        )
+        url = detail_url(self.book.id)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertEqual(
+            self.client.get(detail_url(self.book.id + 1)).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.book.delete()
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_404_NOT_FOUND
+        )
+
+    def test_list_conditional_get(self) -> None:
+        res = self.client.get(BOOK_URL)
+        etag, last_modified = res["ETag"], res["Last-Modified"]
+        with self.assertNumQueries(0):
+            res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(BOOK_URL, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book.title = "Renamed book"
+        self.book.save()
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_detail_conditional_get_follows_inventory(self) -> None:
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@test.com")
+        )
+        list_etag = self.client.get(BOOK_URL)["ETag"]
+        etag = self.client.get(detail_url(self.book.id))["ETag"]
+
+        Book.take_copy(self.book.id)
+        res = self.client.get(BOOK_URL, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        res = self.client.get(
+            detail_url(self.book.id), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["inventory"], 1)
@@ -1,14 +1,24 @@
 from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from django.test import TestCase
+from django.test import AsyncClient, TestCase
 from rest_framework.test import APIClient
 from rest_framework.reverse import reverse
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from book.models import Book
 from borrowing.models import Borrowing
+from borrowing.tasks import check_borrowings_overdue
+from payment.calculations import calculate_fine
+from payment.models import Payment
+from payment.stripe_payment import mark_payments_paid
+from tg_notifications.models import OutboxMessage
 from borrowing.serializers import (
+    BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingRetrieveSerializer
 )
@@ -93,6 +103,120 @@ class AuthenticatedBorrowingApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Book.objects.count(), 2)
 
+    @mock.patch("tg_notifications.tasks.dispatch_outbox.delay")
+    @mock.patch("payment.tasks.open_checkout_session.delay")
+    def test_borrowing_create_opens_session_after_commit(
+            self,
+            open_session,
+            dispatch
+    ) -> None:
+        payload = {
+            "expected_return_date": (timezone.now() + timedelta(days=1)).date(),
+            "book": self.book_2.id,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(BORROWING_URL, payload)
+            open_session.assert_not_called()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        payment = Payment.objects.get(id=res.data["payment_id"])
+        self.assertEqual(payment.status, Payment.Status.PENDING)
+        self.assertIsNone(payment.session_id)
+        open_session.assert_called_once_with(payment.id)
+
+    def test_borrowing_export_only_own_rows(self) -> None:
+        res = self.client.get(reverse("borrowings:borrowing-export"))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "text/csv")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[0], "id")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{self.borrowing_1.id},"))
+
+    async def test_borrowing_export_streams_under_asgi(self) -> None:
+        token = AccessToken.for_user(self.user)
+        res = await AsyncClient().get(
+            reverse("borrowings:borrowing-export"),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # An async body is sent chunk by chunk instead of read into a list
+        self.assertTrue(res.is_async)
+        lines = b"".join(
+            [chunk async for chunk in res.streaming_content]
+        ).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f"{self.borrowing_1.id},"))
+
+    def test_borrowing_export_invalid_format(self) -> None:
+        res = self.client.get(
+            reverse("borrowings:borrowing-export"),
+            {"export_format": "xlsx"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_borrowing_create_checks_duplicates_once(self) -> None:
+        payload = {
+            "expected_return_date": (timezone.now() + timedelta(days=1)).date(),
+            "book": self.book_2.id,
+        }
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BORROWING_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        active_lookups = [
+            query["sql"] for query in queries.captured_queries
+            if '"actual_return_date" IS NULL' in query["sql"]
+        ]
+        self.assertEqual(len(active_lookups), 1)
+
+    def test_duplicate_active_borrowing_rejected_by_constraint(self) -> None:
+        Borrowing.objects.create(
+            expected_return_date=timezone.now() + timedelta(days=1),
+            book=self.book_2,
+            user=self.user
+        )
+        with self.assertRaises(IntegrityError):
+            Borrowing.objects.create(
+                expected_return_date=timezone.now() + timedelta(days=1),
+                book=self.book_2,
+                user=self.user
+            )
+        self.book_2.refresh_from_db()
+        self.assertEqual(self.book_2.inventory, 1)
+
+    def test_concurrent_duplicate_reported_as_already_borrowed(self) -> None:
+        Borrowing.objects.create(
+            expected_return_date=timezone.now() + timedelta(days=1),
+            book=self.book_2,
+            user=self.user
+        )
+        payload = {
+            "expected_return_date": (timezone.now() + timedelta(days=1)).date(),
+            "book": self.book_2.id,
+        }
+        # As if the other request inserted between can_borrow() and save()
+        with mock.patch.object(Borrowing, "can_borrow"):
+            res = self.client.post(BORROWING_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already borrowed", str(res.data))
+
+    def test_other_integrity_errors_are_not_reported_as_duplicates(
+            self
+    ) -> None:
+        serializer = BorrowingSerializer(
+            data={
+                "expected_return_date": (
+                    timezone.now() + timedelta(days=1)
+                ).date(),
+                "book": self.book_2.id,
+            },
+            context={"request": mock.Mock(user=self.user)},
+        )
+        serializer.is_valid(raise_exception=True)
+        with mock.patch.object(
+                Borrowing, "save", side_effect=IntegrityError("NOT NULL")
+        ), self.assertRaises(IntegrityError):
+            serializer.save(user=self.user)
+
     def test_retrieve_borrowing(self) -> None:
         res = self.client.get(detail_url(self.borrowing_1.id))
         serializer = BorrowingRetrieveSerializer(self.borrowing_1)
@@ -115,8 +239,21 @@ class AuthenticatedBorrowingApiTest(TestCase):
         res = self.client.post(url)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data["detail"], "Book returned in time, no fine required.")
+        self.book_1.refresh_from_db()
         self.assertEqual(self.book_1.inventory, 1)
 
+    def test_borrowing_does_not_oversell_stale_book(self):
+        Book.objects.filter(pk=self.book_2.pk).update(inventory=0)
+        with self.assertRaises(ValueError):
+            Borrowing.objects.create(
+                expected_return_date=timezone.now() + timedelta(days=1),
+                book=self.book_2,
+                user=self.user
+            )
+        self.book_2.refresh_from_db()
+        self.assertEqual(self.book_2.inventory, 0)
+        self.assertFalse(Borrowing.objects.filter(book=self.book_2).exists())
+
     def test_already_returned_book(self):
         url = f"/api/borrowings/{self.borrowing_1.id}/return/"
         self.borrowing_1.actual_return_date = timezone.now().date()
@@ -136,6 +273,50 @@ class AuthenticatedBorrowingApiTest(TestCase):
         self.assertIsNotNone(self.borrowing_1.actual_return_date)
 
 
+    def test_borrowing_list_conditional_get(self) -> None:
+        res = self.client.get(BORROWING_URL)
+        etag = res["ETag"]
+        self.assertIn("Last-Modified", res)
+        with self.assertNumQueries(0):
+            res = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+
+        self.client.post(f"/api/borrowings/{self.borrowing_1.id}/return/")
+        res = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    @mock.patch("tg_notifications.tasks.dispatch_outbox.delay")
+    def test_payment_update_refreshes_borrowing_etag(self, dispatch) -> None:
+        payment = Payment.objects.create(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing=self.borrowing_1,
+            money_to_pay=1,
+        )
+        etag = self.client.get(BORROWING_URL)["ETag"]
+        mark_payments_paid([payment.id])
+        res = self.client.get(BORROWING_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_borrowing_retrieve_conditional_get(self) -> None:
+        url = detail_url(self.borrowing_1.id)
+        etag = self.client.get(url)["ETag"]
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.book_1.title = "Renamed book"
+        self.book_1.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["book"], "Renamed book")
+        self.assertEqual(
+            self.client.get(detail_url(self.borrowing_2.id)).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+
 class AdminBorrowingApiTest(TestCase):
 
     def setUp(self) -> None:
@@ -201,7 +382,95 @@ class AdminBorrowingApiTest(TestCase):
         self.assertEqual(len(res.data["results"]), borrowings.count())
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_admin_borrowing_list_query_count_is_fixed(self) -> None:
+        book = Book.objects.create(
+            title="Popular book",
+            author="Popular Author",
+            cover=Book.CoverType.SOFT,
+            inventory=10,
+            daily_fee=0.5
+        )
+        for _ in range(5):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=timezone.now() + timedelta(days=1),
+                book=book,
+                user=self.user_2,
+                actual_return_date=timezone.now()
+            )
+            for payment_type in Payment.Type.values:
+                Payment.objects.create(
+                    status=Payment.Status.PAID,
+                    type=payment_type,
+                    borrowing=borrowing,
+                    money_to_pay=1.0
+                )
+        with self.assertNumQueries(2):
+            res = self.client.get(
+                BORROWING_URL, {"pagination": "cursor", "limit": 20}
+            )
+        self.assertEqual(len(res.data["results"]), 7)
+        self.assertEqual(
+            res.data["results"][-1]["payment_info"][0]["user"],
+            self.user_2.email
+        )
+
     def test_admin_borrowing_delete(self) -> None:
         res = self.client.delete(detail_url(self.borrowing_1.id))
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Book.objects.count(), 1)
+
+
+@mock.patch("tg_notifications.tasks.dispatch_outbox.delay")
+class OverdueBorrowingsTaskTest(TestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email="late@test.test",
+            password="Testpsw1",
+        )
+        self.book = Book.objects.create(
+            title="Late book",
+            author="Late Author",
+            cover=Book.CoverType.SOFT,
+            inventory=5,
+            daily_fee=0.35
+        )
+
+    def test_no_overdue_borrowings(self, dispatch) -> None:
+        result = check_borrowings_overdue()
+        self.assertEqual(result["overdue"], 0)
+        self.assertEqual(
+            OutboxMessage.objects.get().message,
+            "No borrowings overdue today!"
+        )
+
+    def test_overdue_fines_are_computed_in_database(self, dispatch) -> None:
+        today = timezone.now().date()
+        borrowing = Borrowing.objects.create(
+            expected_return_date=today - timedelta(days=3),
+            book=self.book,
+            user=self.user
+        )
+        Borrowing.objects.create(
+            expected_return_date=today + timedelta(days=3),
+            book=self.book,
+            user=get_user_model().objects.create_user(
+                email="on_time@test.test",
+                password="Testpsw2",
+            )
+        )
+        fine = calculate_fine(
+            borrowing.expected_return_date, today, self.book.daily_fee
+        )
+
+        with self.assertNumQueries(3):
+            result = check_borrowings_overdue()
+
+        self.assertEqual(result["overdue"], 1)
+        self.assertEqual(result["total_fine"], str(fine))
+        digest, summary = OutboxMessage.objects.values_list(
+            "message", flat=True
+        )
+        self.assertIn(f"#{borrowing.id} late@test.test", digest)
+        self.assertIn(f"fine {fine}$", digest)
+        self.assertIn("Overdue borrowings today: 1", summary)
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from prometheus_client import REGISTRY
+from book.models import Book
+from borrowing.tasks import check_borrowings_overdue
+
+METRICS_URL = reverse("metrics")
+
+
+class MetricsEndpointTest(TestCase):
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+        )
+
+    def test_request_metrics_per_view_and_action(self) -> None:
+        self.client.force_authenticate(self.user)
+        self.client.get(reverse("books:book-list"))
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, 200)
+        body = res.content.decode()
+        self.assertIn(
+            'library_http_request_duration_seconds_count{action="list",'
+            'method="GET",status="200",view="books:book-list"}',
+            body
+        )
+        self.assertIn("library_http_request_db_queries_bucket", body)
+        self.assertIn("library_active_borrowings 0.0", body)
+
+    def test_business_gauges_are_cached(self) -> None:
+        with self.assertNumQueries(2):
+            self.client.get(METRICS_URL)
+        with self.assertNumQueries(0):
+            self.client.get(METRICS_URL)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token_required_when_configured(self) -> None:
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None, DJANGO_ENV="production")
+    def test_closed_in_production_without_token(self) -> None:
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 403)
+
+
+class CeleryTaskMetricsTest(TestCase):
+
+    @mock.patch("tg_notifications.tasks.dispatch_outbox.delay")
+    def test_task_runs_are_timed_by_outcome(self, *mocks) -> None:
+        labels = {
+            "task": "borrowing.tasks.check_borrowings_overdue",
+            "outcome": "success",
+        }
+        before = REGISTRY.get_sample_value(
+            "library_celery_task_runs_total", labels
+        ) or 0
+        check_borrowings_overdue.apply()
+        self.assertEqual(
+            REGISTRY.get_sample_value("library_celery_task_runs_total", labels),
+            before + 1
+        )
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "library_celery_task_duration_seconds_count", labels
+            ),
+            before + 1
+        )
@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.reverse import reverse
+from rest_framework import status
+from book.models import Book
+from library_service.middleware import QueryBudgetExceeded
+from library_service.timing import collect, track
+
+BOOK_URL = reverse("books:book-list")
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        self.client.force_authenticate(self.user)
+        Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+        )
+
+    def test_server_timing_header(self) -> None:
+        res = self.client.get(BOOK_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # The offset page's COUNT and the page itself
+        self.assertEqual(res.wsgi_request.query_stats.count, 2)
+        self.assertRegex(
+            res["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="2 queries", total;dur=[\d.]+$'
+        )
+
+    @override_settings(
+        QUERY_BUDGETS={"GET books:book-list": 0, "default": 10},
+        QUERY_BUDGET_ACTION="raise",
+    )
+    def test_exceeded_budget_raises(self) -> None:
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(BOOK_URL)
+
+    @override_settings(QUERY_BUDGETS={"books": 0})
+    def test_exceeded_budget_is_logged(self) -> None:
+        with self.assertLogs("library_service.middleware", "WARNING") as logs:
+            self.client.get(BOOK_URL)
+        self.assertIn("GET books:book-list ran 2 queries", logs.output[0])
+
+    def test_track_adds_up_per_name(self) -> None:
+        with collect() as timings:
+            with track("stripe"):
+                pass
+            with track("stripe"):
+                pass
+        self.assertEqual(list(timings), ["stripe"])
+        with track("telegram"):
+            pass
+        self.assertEqual(list(timings), ["stripe"])
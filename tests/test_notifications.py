@@ -0,0 +1,307 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from book.models import Book
+from borrowing.models import Borrowing
+from tg_notifications import fake
+from tg_notifications.bot import (
+    TelegramError,
+    TelegramNotifier,
+    get_notifier,
+)
+from tg_notifications.models import OutboxMessage
+from tg_notifications.notifications import queue_message
+from tg_notifications.tasks import (
+    OUTBOX_MAX_ATTEMPTS,
+    coalesce,
+    dispatch_outbox,
+    purge_outbox,
+)
+
+
+class OutboxTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        self.client.force_authenticate(self.user)
+        self.book = Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+        )
+
+    @mock.patch("tg_notifications.tasks.send_message")
+    def test_return_book_queues_message_after_commit(self, send) -> None:
+        borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timedelta(days=1),
+            book=self.book,
+            user=self.user
+        )
+        with mock.patch(
+                "tg_notifications.tasks.dispatch_outbox.delay"
+        ) as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(
+                    f"/api/borrowings/{borrowing.id}/return/"
+                )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        send.assert_not_called()
+        dispatch.assert_called_once()
+        self.assertIn(
+            "has returned book",
+            OutboxMessage.objects.get().message
+        )
+
+    @mock.patch("tg_notifications.tasks.send_message")
+    def test_dispatch_marks_messages_sent(self, send) -> None:
+        OutboxMessage.objects.create(message="first")
+        OutboxMessage.objects.create(message="second")
+        self.assertEqual(dispatch_outbox(), {"sent": 2, "failed": 0, "digests": 0})
+        self.assertEqual(
+            [call.args[0] for call in send.call_args_list],
+            ["first", "second"]
+        )
+        self.assertFalse(
+            OutboxMessage.objects.exclude(
+                status=OutboxMessage.Status.SENT
+            ).exists()
+        )
+
+    @mock.patch(
+        "tg_notifications.tasks.send_message",
+        side_effect=Exception("Telegram is down")
+    )
+    def test_dispatch_backs_off_and_gives_up(self, send) -> None:
+        message = OutboxMessage.objects.create(message="flaky")
+        self.assertEqual(dispatch_outbox(), {"sent": 0, "failed": 1, "digests": 0})
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.Status.PENDING)
+        self.assertGreater(message.available_at, timezone.now())
+        self.assertEqual(dispatch_outbox(), {"sent": 0, "failed": 0, "digests": 0})
+
+        OutboxMessage.objects.filter(pk=message.pk).update(
+            attempts=OUTBOX_MAX_ATTEMPTS - 1,
+            available_at=timezone.now()
+        )
+        dispatch_outbox()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxMessage.Status.FAILED)
+        self.assertEqual(message.last_error, "Telegram is down")
+
+    def test_queue_message_is_rolled_back_with_caller(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                queue_message("lost")
+                raise RuntimeError("caller failed")
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    @override_settings(TELEGRAM_BACKEND="tg_notifications.fake.send_message")
+    def test_dispatch_through_configured_backend(self) -> None:
+        fake.outbox.clear()
+        OutboxMessage.objects.create(message="to the stand-in")
+        self.assertEqual(dispatch_outbox(), {"sent": 1, "failed": 0, "digests": 0})
+        self.assertEqual(list(fake.outbox), ["to the stand-in"])
+
+    def test_stored_error_hides_bot_token(self) -> None:
+        notifier = TelegramNotifier("123:secret", ["1"])
+        message = OutboxMessage.objects.create(message="unreachable")
+        with mock.patch(
+                "tg_notifications.notifications.get_notifier",
+                return_value=notifier,
+        ), mock.patch.object(
+            notifier.session,
+            "post",
+            side_effect=requests.ConnectionError(
+                "Max retries exceeded with url: /bot123:secret/sendMessage"
+            ),
+        ):
+            dispatch_outbox()
+        message.refresh_from_db()
+        self.assertNotIn("secret", message.last_error)
+        self.assertIn("/bot<token>/sendMessage", message.last_error)
+
+    @mock.patch("tg_notifications.tasks.send_message")
+    @override_settings(OUTBOX_RETENTION_DAYS=7)
+    def test_purge_keeps_recent_and_failed_messages(self, send) -> None:
+        digest = OutboxMessage.objects.create(message="digest")
+        OutboxMessage.objects.create(
+            message="event",
+            status=OutboxMessage.Status.MERGED,
+            digest=digest,
+        )
+        failed = OutboxMessage.objects.create(
+            message="failed", status=OutboxMessage.Status.FAILED
+        )
+        dispatch_outbox()
+        recent = OutboxMessage.objects.create(message="recent")
+        later = timezone.now() + timedelta(days=8)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            dispatch_outbox()
+        self.assertEqual(purge_outbox(later), 2)
+        self.assertEqual(
+            set(OutboxMessage.objects.values_list("id", flat=True)),
+            {failed.id, recent.id},
+        )
+
+    @override_settings(TELEGRAM_MAX_RETRY_AFTER=30)
+    def test_retry_resends_only_to_failed_chats(self) -> None:
+        adapter = fake.FakeTelegramAdapter(rate_limited=1, retry_after=60)
+        notifier = TelegramNotifier("token", ["1", "2"], adapter=adapter)
+        message = OutboxMessage.objects.create(message="to both chats")
+        with mock.patch(
+                "tg_notifications.notifications.get_notifier",
+                return_value=notifier,
+        ):
+            self.assertEqual(
+                dispatch_outbox(), {"sent": 0, "failed": 1, "digests": 0}
+            )
+            message.refresh_from_db()
+            self.assertEqual(len(message.delivered_chats), 1)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                available_at=timezone.now()
+            )
+            self.assertEqual(
+                dispatch_outbox(), {"sent": 1, "failed": 0, "digests": 0}
+            )
+        message.refresh_from_db()
+        self.assertEqual(sorted(message.delivered_chats), ["1", "2"])
+        self.assertEqual(
+            sorted(payload["chat_id"] for _, payload in adapter.sent),
+            ["1", "2"],
+        )
+
+    @mock.patch(
+        "tg_notifications.tasks.send_message",
+        side_effect=TelegramError("Too Many Requests", retry_after=120),
+    )
+    def test_dispatch_waits_out_retry_after(self, send) -> None:
+        message = OutboxMessage.objects.create(message="rate limited")
+        dispatch_outbox()
+        message.refresh_from_db()
+        self.assertGreater(
+            message.available_at, timezone.now() + timedelta(seconds=100)
+        )
+
+
+@mock.patch("tg_notifications.tasks.send_message")
+class DigestTest(TestCase):
+
+    def queue(self, count: int) -> None:
+        for number in range(count):
+            queue_message(
+                f"New borrowing {number}",
+                OutboxMessage.EventType.BORROWING_CREATED,
+                f"#{number} user@test.com | Test book",
+            )
+
+    def test_events_wait_for_their_window(self, send) -> None:
+        self.queue(3)
+        self.assertEqual(dispatch_outbox(), {"sent": 0, "failed": 0, "digests": 0})
+        send.assert_not_called()
+
+        self.assertEqual(coalesce(timezone.now() + timedelta(seconds=61)), 1)
+        self.assertEqual(dispatch_outbox(), {"sent": 1, "failed": 0, "digests": 0})
+        digest = send.call_args.args[0]
+        self.assertRegex(digest, r"^3 new borrowings in the last \d+s\n#0 ")
+        self.assertEqual(digest.count("Test book"), 3)
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.Status.MERGED,
+                digest__status=OutboxMessage.Status.SENT,
+            ).count(),
+            3,
+        )
+
+    @override_settings(NOTIFICATION_DIGEST_MAX_EVENTS=2)
+    def test_full_buffer_flushes_early(self, send) -> None:
+        self.queue(5)
+        self.assertEqual(dispatch_outbox(), {"sent": 2, "failed": 0, "digests": 2})
+        self.assertEqual(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.Status.BUFFERED
+            ).count(),
+            1,
+        )
+
+    def test_single_event_keeps_its_message(self, send) -> None:
+        self.queue(1)
+        coalesce(timezone.now() + timedelta(seconds=61))
+        dispatch_outbox()
+        send.assert_called_once_with("New borrowing 0", [])
+
+    def test_reports_are_not_buffered(self, send) -> None:
+        queue_message("No borrowings overdue today!")
+        self.assertEqual(dispatch_outbox(), {"sent": 1, "failed": 0, "digests": 0})
+
+
+@override_settings(TELEGRAM_CHAT_RATE=20, TELEGRAM_GLOBAL_RATE=100)
+class TelegramNotifierTest(SimpleTestCase):
+
+    def notifier(self, **adapter_options):
+        self.adapter = fake.FakeTelegramAdapter(**adapter_options)
+        return TelegramNotifier("token", ["1", "2"], adapter=self.adapter)
+
+    def test_broadcast_posts_json_to_every_chat(self) -> None:
+        self.notifier().broadcast("Return & pay? #42")
+        self.assertEqual(
+            sorted(payload["chat_id"] for _, payload in self.adapter.sent),
+            ["1", "2"],
+        )
+        self.assertEqual(
+            {payload["text"] for _, payload in self.adapter.sent},
+            {"Return & pay? #42"},
+        )
+
+    def test_chat_rate_is_enforced(self) -> None:
+        notifier = self.notifier()
+        for number in range(3):
+            notifier.send("1", f"message {number}")
+        sent_at = [sent_at for sent_at, _ in self.adapter.sent]
+        self.assertGreaterEqual(sent_at[2] - sent_at[0], 0.09)
+
+    def test_retry_after_is_honoured(self) -> None:
+        notifier = self.notifier(rate_limited=1, retry_after=0.2)
+        started = time.monotonic()
+        notifier.send("1", "after a pause")
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(len(self.adapter.sent), 1)
+
+    def test_broadcast_skips_delivered_chats(self) -> None:
+        delivered = ["1"]
+        self.notifier().broadcast("only to 2", delivered=delivered)
+        self.assertEqual(
+            [payload["chat_id"] for _, payload in self.adapter.sent], ["2"]
+        )
+        self.assertEqual(delivered, ["1", "2"])
+
+    def test_concurrent_first_calls_share_one_notifier(self) -> None:
+        with override_settings(TELEGRAM_CHAT_IDS=["1"]), mock.patch(
+                "tg_notifications.bot.TelegramNotifier",
+                side_effect=lambda *args: time.sleep(0.05) or object(),
+        ) as notifier_class, ThreadPoolExecutor(max_workers=8) as executor:
+            notifiers = set(executor.map(lambda _: get_notifier(), range(8)))
+        self.assertEqual(notifier_class.call_count, 1)
+        self.assertEqual(len(notifiers), 1)
+
+    @override_settings(TELEGRAM_MAX_RETRY_AFTER=30)
+    def test_long_retry_after_is_raised(self) -> None:
+        notifier = self.notifier(rate_limited=1, retry_after=60)
+        with self.assertRaises(TelegramError) as raised:
+            notifier.broadcast("later")
+        self.assertEqual(raised.exception.retry_after, 60)
+        self.assertEqual(len(self.adapter.sent), 1)
@@ -0,0 +1,425 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework.reverse import reverse
+from rest_framework import status
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.gateway import StripeGateway, get_gateway
+from payment.fake_stripe import checkout_session_event, signed_event
+from payment.models import Payment
+from payment.serializers import PaymentSerializer, PaymentListSerializer
+from payment.stripe_payment import payment_idempotency_key
+from payment.tasks import check_session_for_expiration, open_checkout_session
+from tg_notifications.models import OutboxMessage
+
+PAYMENT_URL = reverse("payments:payment-list")
+SUCCESS_URL = reverse("payments:payment-success")
+WEBHOOK_URL = reverse("payments:payment-webhook")
+WEBHOOK_SECRET = "whsec_test"
+
+
+def detail_url(payment_id: int) -> str:
+    return reverse("borrowings:payment-detail", args=[payment_id])
+
+
+class UnauthenticatedPaymentApiTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+
+    def test_auth_required(self) -> None:
+        res = self.client.get(PAYMENT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AuthenticatedAndAdminUserPaymentTestView(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        self.user_2 = get_user_model().objects.create_user(
+            email="other_user@test.com",
+            password="test_psw2",
+            is_staff=True
+        )
+        self.client.force_authenticate(user=self.user)
+        self.book_1 = Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+
+        )
+        self.borrowing_1 = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timedelta(days=1),
+            book=self.book_1,
+            user=self.user
+
+        )
+        self.borrowing_2 = Borrowing.objects.create(
+            expected_return_date=timezone.now() - timedelta(days=2),
+            book=self.book_1,
+            user=self.user_2,
+            actual_return_date=timezone.now() - timedelta(days=1)
+
+        )
+        self.payment_1 = Payment.objects.create(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing=self.borrowing_1,
+            money_to_pay=2.0
+        )
+        self.payment_2 = Payment.objects.create(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing=self.borrowing_2,
+            money_to_pay=3.0
+        )
+
+    def test_have_not_access_to_all_payments(self) -> None:
+        payments = Payment.objects.filter(borrowing__user=self.user)
+        serializer = PaymentListSerializer(payments, many=True)
+        res = self.client.get(PAYMENT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], serializer.data)
+        self.assertEqual(len(res.data["results"]), payments.count())
+
+    def test_admin_has_access_to_all_payments(self) -> None:
+        self.client.force_authenticate(user=self.user_2)
+        payments = Payment.objects.all()
+        serializer = PaymentListSerializer(payments, many=True)
+        res = self.client.get(PAYMENT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], serializer.data)
+        self.assertEqual(len(res.data["results"]), payments.count())
+
+    def test_payment_list_query_count_is_fixed(self) -> None:
+        self.client.force_authenticate(user=self.user_2)
+        with self.assertNumQueries(1):
+            res = self.client.get(PAYMENT_URL, {"pagination": "cursor"})
+        self.assertEqual(len(res.data["results"]), 2)
+
+    @override_settings(STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway")
+    def test_session_is_polled_until_ready(self) -> None:
+        url = reverse("payments:payment-session", args=[self.payment_1.id])
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(res.data["session_url"])
+
+        session_id = open_checkout_session(self.payment_1.id)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["session_id"], session_id)
+        self.assertIn(session_id, res.data["session_url"])
+
+    @override_settings(STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway")
+    def test_retried_session_creation_reuses_stripe_session(self) -> None:
+        session_id = open_checkout_session(self.payment_1.id)
+        Payment.objects.filter(id=self.payment_1.id).update(session_id=None)
+        self.assertEqual(open_checkout_session(self.payment_1.id), session_id)
+        self.assertEqual(len(get_gateway().sessions), 1)
+
+    @override_settings(STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway")
+    def test_success_marks_paid_session_paid(self) -> None:
+        session_id = open_checkout_session(self.payment_1.id)
+        res = self.client.get(SUCCESS_URL, {"session_id": session_id})
+        self.payment_1.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.payment_1.status, Payment.Status.PENDING)
+
+        get_gateway().complete(session_id)
+        res = self.client.get(SUCCESS_URL, {"session_id": session_id})
+        self.payment_1.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.payment_1.status, Payment.Status.PAID)
+
+    @override_settings(
+        STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway",
+        STRIPE_FAKE_LATENCY_MS=1,
+    )
+    async def test_success_under_asgi(self) -> None:
+        session_id = await sync_to_async(open_checkout_session)(self.payment_1.id)
+        get_gateway().complete(session_id)
+
+        res = await AsyncClient().get(SUCCESS_URL, {"session_id": session_id})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("stripe;dur=", res["Server-Timing"])
+        # Queries run in the request's sync thread are still counted
+        self.assertRegex(res["Server-Timing"], r'desc="[1-9]\d* queries"')
+        payment = await Payment.objects.aget(id=self.payment_1.id)
+        self.assertEqual(payment.status, Payment.Status.PAID)
+
+    def test_gateway_sends_idempotency_key(self) -> None:
+        gateway = StripeGateway()
+        with mock.patch.object(
+                gateway.client.checkout.sessions, "create"
+        ) as create:
+            gateway.create_checkout_session({"mode": "payment"}, "key-1")
+        create.assert_called_once_with(
+            {"mode": "payment"}, options={"idempotency_key": "key-1"}
+        )
+        self.assertEqual(
+            payment_idempotency_key(self.payment_1),
+            f"payment-{self.borrowing_1.id}-payment-{self.payment_1.id}",
+        )
+
+    def test_gateway_awaits_stripe_on_a_long_lived_loop(self) -> None:
+        gateway = StripeGateway()
+        client = mock.Mock()
+        client.checkout.sessions.retrieve_async = mock.AsyncMock(
+            return_value={"id": "cs_1"}
+        )
+        with mock.patch.object(gateway, "async_client", return_value=client):
+            session = asyncio.run(gateway.aretrieve_checkout_session("cs_1"))
+        self.assertEqual(session, {"id": "cs_1"})
+        client.checkout.sessions.retrieve_async.assert_awaited_once_with("cs_1")
+
+    def test_gateway_uses_sync_client_under_async_to_sync(self) -> None:
+        gateway = StripeGateway()
+        with mock.patch.object(
+                gateway.client.checkout.sessions,
+                "retrieve",
+                return_value={"id": "cs_1"},
+        ) as retrieve:
+            session = async_to_sync(gateway.aretrieve_checkout_session)("cs_1")
+        self.assertEqual(session, {"id": "cs_1"})
+        retrieve.assert_called_once_with("cs_1")
+        self.assertEqual(len(gateway.async_clients), 0)
+
+    def test_concurrent_first_calls_share_one_gateway(self) -> None:
+        built = []
+
+        def build():
+            built.append(object())
+            time.sleep(0.05)
+            return built[-1]
+
+        with override_settings(STRIPE_TIMEOUT=1), mock.patch(
+                "payment.gateway.import_string", return_value=build
+        ), ThreadPoolExecutor(max_workers=8) as executor:
+            gateways = set(executor.map(lambda _: get_gateway(), range(8)))
+        self.assertEqual(len(built), 1)
+        self.assertEqual(gateways, set(built))
+
+    def test_payment_export_ndjson(self) -> None:
+        res = self.client.get(
+            reverse("payments:payment-export"),
+            {"export_format": "ndjson"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        rows = [
+            json.loads(line)
+            for line in b"".join(res.streaming_content).splitlines()
+        ]
+        self.assertEqual([row["id"] for row in rows], [self.payment_1.id])
+        self.assertEqual(rows[0]["user_email"], self.user.email)
+        self.assertEqual(rows[0]["money_to_pay"], "2.00")
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        book = Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=2,
+            daily_fee=0.5
+        )
+        borrowing = Borrowing.objects.create(
+            expected_return_date=timezone.now() + timedelta(days=1),
+            book=book,
+            user=user
+        )
+        self.payment = Payment.objects.create(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.PAYMENT,
+            borrowing=borrowing,
+            session_id="cs_test_1",
+            money_to_pay=1.0
+        )
+
+    def post_event(self, event: dict, secret: str = WEBHOOK_SECRET):
+        payload, signature = signed_event(event, secret)
+        return self.client.post(
+            WEBHOOK_URL,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=signature,
+        )
+
+    def test_invalid_signature_is_rejected(self) -> None:
+        res = self.post_event(
+            checkout_session_event("cs_test_1"), secret="whsec_other"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PENDING)
+
+    @mock.patch("payment.stripe_payment.queue_message")
+    def test_completed_event_is_idempotent(self, queue_message) -> None:
+        event = checkout_session_event("cs_test_1")
+        for _ in range(2):
+            res = self.post_event(event)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PAID)
+        queue_message.assert_called_once()
+
+    def test_unpaid_completed_event_keeps_payment_pending(self) -> None:
+        self.post_event(
+            checkout_session_event("cs_test_1", payment_status="unpaid")
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PENDING)
+
+    def test_expired_event_marks_payment_expired(self) -> None:
+        res = self.post_event(
+            checkout_session_event(
+                "cs_test_1",
+                event_type="checkout.session.expired",
+                payment_status="unpaid",
+            )
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.EXPIRED)
+
+    def test_expired_event_does_not_override_paid(self) -> None:
+        Payment.objects.filter(id=self.payment.id).update(
+            status=Payment.Status.PAID
+        )
+        self.post_event(
+            checkout_session_event(
+                "cs_test_1", event_type="checkout.session.expired"
+            )
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PAID)
+
+
+@override_settings(STRIPE_BACKEND="payment.fake_stripe.FakeStripeGateway")
+@mock.patch("payment.tasks.open_checkout_session.delay")
+class ReconcileSessionsTaskTest(TestCase):
+
+    def setUp(self) -> None:
+        user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        book = Book.objects.create(
+            title="Test book",
+            author="Test Author",
+            cover=Book.CoverType.HARD,
+            inventory=5,
+            daily_fee=0.5
+        )
+        self.payments = []
+        for _ in range(3):
+            borrowing = Borrowing.objects.create(
+                expected_return_date=timezone.now() + timedelta(days=1),
+                book=book,
+                user=user
+            )
+            Borrowing.objects.filter(id=borrowing.id).update(
+                actual_return_date=timezone.now()
+            )
+            payment = Payment.objects.create(
+                status=Payment.Status.PENDING,
+                type=Payment.Type.PAYMENT,
+                borrowing=borrowing,
+                money_to_pay=1.0
+            )
+            self.payments.append(payment)
+            open_checkout_session(payment.id)
+
+    def test_sessions_are_reconciled_in_batches(self, open_session) -> None:
+        paid, expired, still_open = [
+            Payment.objects.get(id=payment.id) for payment in self.payments
+        ]
+        get_gateway().complete(paid.session_id)
+        get_gateway().expire(expired.session_id)
+        unopened = Payment.objects.create(
+            status=Payment.Status.PENDING,
+            type=Payment.Type.FINE,
+            borrowing=paid.borrowing,
+            money_to_pay=1.0
+        )
+
+        with mock.patch("tg_notifications.tasks.dispatch_outbox.delay"):
+            result = check_session_for_expiration(concurrency=2)
+
+        self.assertEqual(
+            (result["checked"], result["expired"], result["paid"]), (3, 1, 1)
+        )
+        self.assertIn("sessions_per_sec", result)
+        statuses = dict(Payment.objects.values_list("id", "status"))
+        self.assertEqual(statuses[paid.id], Payment.Status.PAID)
+        self.assertEqual(statuses[expired.id], Payment.Status.EXPIRED)
+        self.assertEqual(statuses[still_open.id], Payment.Status.PENDING)
+        open_session.assert_called_once_with(unopened.id)
+        self.assertEqual(
+            OutboxMessage.objects.filter(message__startswith="User ").count(), 1
+        )
+
+
+@skipUnless(
+    connection.vendor in ("postgresql", "sqlite"),
+    "EXPLAIN output is only parsed for PostgreSQL and SQLite"
+)
+class PaymentIndexTest(TestCase):
+
+    def setUp(self) -> None:
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        if connection.vendor == "postgresql":
+            # Test tables are tiny, make the planner prove it can use the index
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name: str = None) -> None:
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan on payment_payment", plan)
+            self.assertIn(index_name or "payment_payment", plan)
+        else:
+            self.assertNotIn("SCAN payment_payment", plan)
+            self.assertIn("SEARCH payment_payment USING", plan)
+
+    def test_session_id_lookup_uses_index(self) -> None:
+        self.assertUsesIndex(
+            Payment.objects.filter(session_id="cs_test_1"),
+            "payment_payment_session_id",
+        )
+
+    def test_pending_payments_of_user_use_status_index(self) -> None:
+        self.assertUsesIndex(
+            Payment.objects.filter(
+                borrowing__user=self.user, status=Payment.Status.PENDING
+            ),
+            "payment_status_borrowing_idx",
+        )
@@ -0,0 +1,106 @@
+from unittest import mock
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from library_service.throttling import LocalGCRAStore
+
+BOOK_URL = reverse("books:book-list")
+BORROWING_URL = reverse("borrowings:borrowing-list")
+
+
+def throttle_rates(**rates):
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {
+            "anon": "1000/day",
+            "user": "1000/day",
+            **rates,
+        },
+    }
+
+
+@override_settings(THROTTLE_REDIS_URL=None)
+class GCRAThrottleTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="throttle@test.test",
+            password="Testpsw1",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_burst_then_retry_after(self) -> None:
+        with override_settings(REST_FRAMEWORK=throttle_rates(books="3/min")):
+            codes = [self.client.get(BOOK_URL).status_code for _ in range(4)]
+            res = self.client.get(BOOK_URL)
+
+        self.assertEqual(codes, [200, 200, 200, 429])
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res["Retry-After"], "20")
+
+    def test_action_rate_overrides_view_rate(self) -> None:
+        rates = throttle_rates(
+            **{"borrowings": "100/min", "borrowings.create": "2/min"}
+        )
+        with override_settings(REST_FRAMEWORK=rates):
+            creates = [
+                self.client.post(BORROWING_URL, {}).status_code
+                for _ in range(3)
+            ]
+            res = self.client.get(BORROWING_URL)
+
+        self.assertEqual(creates, [400, 400, 429])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_rates_are_per_user(self) -> None:
+        other = APIClient()
+        other.force_authenticate(
+            get_user_model().objects.create_user(
+                email="other@test.test",
+                password="Testpsw2",
+            )
+        )
+        with override_settings(REST_FRAMEWORK=throttle_rates(books="1/min")):
+            self.client.get(BOOK_URL)
+            throttled = self.client.get(BOOK_URL)
+            res = other.get(BOOK_URL)
+
+        self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_store_errors_let_requests_through(self) -> None:
+        store = mock.Mock()
+        store.acquire.side_effect = redis.ConnectionError("down")
+        with override_settings(REST_FRAMEWORK=throttle_rates(books="1/min")), \
+                mock.patch(
+                    "library_service.throttling.get_store",
+                    return_value=store,
+                ), self.assertLogs("library_service.throttling", "WARNING"):
+            codes = [self.client.get(BOOK_URL).status_code for _ in range(3)]
+
+        self.assertEqual(codes, [200, 200, 200])
+
+
+class LocalGCRAStoreTest(TestCase):
+
+    @mock.patch("library_service.throttling.time.monotonic")
+    def test_requests_are_spaced_by_interval(self, monotonic) -> None:
+        store = LocalGCRAStore()
+        monotonic.return_value = 100.0
+
+        self.assertEqual(store.acquire("key", 10, 10), 0)
+        self.assertEqual(store.acquire("key", 10, 10), 0)
+        self.assertEqual(store.acquire("key", 10, 10), 10)
+
+        monotonic.return_value = 105.0
+        self.assertEqual(store.acquire("key", 10, 10), 5)
+        monotonic.return_value = 110.0
+        self.assertEqual(store.acquire("key", 10, 10), 0)
+        self.assertEqual(store.acquire("other", 10, 10), 0)
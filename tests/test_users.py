@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework.reverse import reverse
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from user.authentication import ClaimsJWTAuthentication
+
+TOKEN_URL = reverse("users:token_obtain_pair")
+ME_URL = reverse("users:manage_user")
+BORROWING_URL = reverse("borrowings:borrowing-list")
+
+
+class ClaimsJWTAuthenticationTest(TestCase):
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com",
+            password="test_psw1",
+        )
+        res = self.client.post(
+            TOKEN_URL, {"email": "user@test.com", "password": "test_psw1"}
+        )
+        self.token = res.data["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
+
+    def user_queries(self, url: str) -> list:
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [
+            query["sql"] for query in queries
+            if query["sql"].startswith('SELECT "user_user"')
+        ]
+
+    def test_token_carries_claims(self) -> None:
+        token = AccessToken(self.token)
+        self.assertEqual(token["email"], "user@test.com")
+        self.assertNotIn("is_staff", token)
+
+    def test_user_row_is_loaded_once(self) -> None:
+        self.assertEqual(len(self.user_queries(BORROWING_URL)), 1)
+        self.assertEqual(self.user_queries(BORROWING_URL), [])
+
+    def test_deactivation_applies_to_issued_tokens(self) -> None:
+        self.client.get(BORROWING_URL)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(BORROWING_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_flag_follows_the_database(self) -> None:
+        admin_url = reverse("books:book-list")
+        data = {
+            "title": "Staff book",
+            "author": "Author",
+            "cover": "Hard",
+            "inventory": 1,
+            "daily_fee": "1.00",
+        }
+        res = self.client.post(admin_url, data)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.post(admin_url, data)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_email_follows_the_database(self) -> None:
+        self.user.email = "renamed@test.com"
+        self.user.save()
+        user = ClaimsJWTAuthentication().get_user(AccessToken(self.token))
+        self.assertEqual(user.email, "renamed@test.com")
+
+    def test_manage_user_updates_full_row(self) -> None:
+        res = self.client.patch(ME_URL, {"first_name": "Test"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Test")
+        self.assertTrue(self.user.check_password("test_psw1"))
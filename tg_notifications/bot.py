@@ -0,0 +1,197 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from library_service.timing import track
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+BOT_TOKEN_PATTERN = re.compile(r"/bot[^/\s]+/")
+
+
+def redact(text: str) -> str:
+    """Hide the bot token in request URLs quoted by `text`."""
+    return BOT_TOKEN_PATTERN.sub("/bot<token>/", text)
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Allows `rate` calls per second with bursts of up to `capacity`.
+    `acquire()` blocks until a token is free; `pause()` empties the bucket
+    for a while, as Telegram asks to with `retry_after`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated) * self.rate,
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.tokens = -seconds * self.rate
+            self.updated = time.monotonic()
+
+
+class TelegramNotifier:
+    """
+    Sends staff notifications through the Bot API.
+
+    Requests are JSON POSTs over one keep-alive session. Every send waits
+    for both the per-chat and the global token bucket, so bursts stay
+    within Telegram's flood limits instead of collecting 429s. When one
+    comes anyway, the chat is paused for `retry_after` and the message is
+    retried. Several chats are served concurrently.
+    """
+
+    def __init__(
+            self,
+            token: str,
+            chat_ids: Iterable[str],
+            adapter: Optional[BaseAdapter] = None,
+    ):
+        self.url = f"{TELEGRAM_API_URL}/bot{token}/sendMessage"
+        self.chat_ids = list(chat_ids)
+        self.session = requests.Session()
+        self.session.mount(
+            "https://",
+            adapter or HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=settings.TELEGRAM_POOL_SIZE,
+            ),
+        )
+        self.global_bucket = TokenBucket(
+            settings.TELEGRAM_GLOBAL_RATE, settings.TELEGRAM_GLOBAL_RATE
+        )
+        self.chat_buckets = {
+            chat_id: TokenBucket(settings.TELEGRAM_CHAT_RATE, 1)
+            for chat_id in self.chat_ids
+        }
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.TELEGRAM_POOL_SIZE,
+            thread_name_prefix="telegram",
+        )
+
+    def send(self, chat_id: str, text: str) -> dict:
+        chat_bucket = self.chat_buckets.setdefault(
+            chat_id, TokenBucket(settings.TELEGRAM_CHAT_RATE, 1)
+        )
+        for _ in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            chat_bucket.acquire()
+            self.global_bucket.acquire()
+            try:
+                with track("telegram"):
+                    response = self.session.post(
+                        self.url,
+                        json={"chat_id": chat_id, "text": text},
+                        timeout=settings.TELEGRAM_TIMEOUT,
+                    )
+                body = response.json()
+            except (requests.RequestException, ValueError) as error:
+                raise TelegramError(
+                    redact(f"Telegram request failed: {error}")
+                )
+
+            if body.get("ok"):
+                return body["result"]
+            retry_after = body.get("parameters", {}).get("retry_after")
+            if response.status_code != 429 or retry_after is None:
+                raise TelegramError(
+                    f"Telegram error {body.get('error_code')}: "
+                    f"{body.get('description')}"
+                )
+            if retry_after > settings.TELEGRAM_MAX_RETRY_AFTER:
+                break
+            chat_bucket.pause(retry_after)
+        raise TelegramError(
+            f"Telegram rate limit for chat {chat_id}", retry_after=retry_after
+        )
+
+    def broadcast(
+            self,
+            text: str,
+            chat_ids: Optional[Iterable[str]] = None,
+            delivered: Optional[list] = None,
+    ):
+        """
+        Send `text` to every chat at once and wait for all of them.
+        Chats already in `delivered` are skipped and every chat that gets
+        the message is appended to it, so a retry only resends to the
+        chats that failed. The first failure is raised once the other
+        chats are done.
+        """
+        chat_ids = self.chat_ids if chat_ids is None else list(chat_ids)
+        if not chat_ids:
+            raise TelegramError("No Telegram chat is configured")
+        if delivered is None:
+            delivered = []
+        futures = {
+            chat_id: self.executor.submit(self.send, chat_id, text)
+            for chat_id in chat_ids
+            if chat_id not in delivered
+        }
+        errors = []
+        for chat_id, future in futures.items():
+            error = future.exception()
+            if error is None:
+                delivered.append(chat_id)
+            else:
+                errors.append(error)
+        if errors:
+            raise errors[0]
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier() -> TelegramNotifier:
+    """Return the process-wide notifier for the configured bot and chats."""
+    global _notifier
+    notifier = _notifier
+    if notifier is None:
+        # Concurrent first calls must not each open their own pool
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = TelegramNotifier(
+                    settings.TG_TOKEN or "", settings.TELEGRAM_CHAT_IDS
+                )
+            notifier = _notifier
+    return notifier
+
+
+@receiver(setting_changed)
+def reset_notifier(*, setting, **kwargs):
+    global _notifier
+    if setting.startswith("TELEGRAM_") or setting == "TG_TOKEN":
+        with _notifier_lock:
+            _notifier = None
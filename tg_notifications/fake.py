@@ -0,0 +1,82 @@
+"""
+Local stand-ins for the Telegram Bot API, used by tests and benchmarks.
+
+Select `send_message` with
+`TELEGRAM_BACKEND = "tg_notifications.fake.send_message"`; every message
+sleeps `TELEGRAM_FAKE_LATENCY_MS` and is kept in `outbox`.
+`FakeTelegramAdapter` answers the HTTP calls of a real
+`TelegramNotifier` instead, to exercise its pooling and rate limiting.
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter
+
+from library_service.timing import track
+
+outbox = deque(maxlen=10_000)
+
+
+def send_message(message: str, delivered: Optional[list] = None):
+    with track("telegram"):
+        if settings.TELEGRAM_FAKE_LATENCY_MS:
+            time.sleep(settings.TELEGRAM_FAKE_LATENCY_MS / 1000)
+        outbox.append(message)
+
+
+class FakeTelegramAdapter(BaseAdapter):
+    """
+    Answers `sendMessage` locally after `latency_ms`. Each sent message is
+    kept in `sent` as (monotonic time, payload). The first
+    `rate_limited` requests get a 429 with `retry_after`.
+    """
+
+    def __init__(
+            self,
+            latency_ms: int = 0,
+            rate_limited: int = 0,
+            retry_after: int = 1,
+    ):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        payload = json.loads(request.body)
+        with self.lock:
+            if self.rate_limited:
+                self.rate_limited -= 1
+                return self.respond(request, 429, {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests",
+                    "parameters": {"retry_after": self.retry_after},
+                })
+            self.sent.append((time.monotonic(), payload))
+            message_id = len(self.sent)
+        return self.respond(request, 200, {
+            "ok": True,
+            "result": {"message_id": message_id, **payload},
+        })
+
+    def respond(self, request, status: int, body: dict):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,66 @@
+# Generated by Django 4.2 on 2026-10-18 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tg_notifications", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="digest",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="events",
+                to="tg_notifications.outboxmessage",
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="event_type",
+            field=models.CharField(
+                choices=[
+                    ("borrowing_created", "new borrowings"),
+                    ("borrowing_returned", "returned books"),
+                    ("payment_paid", "paid payments"),
+                    ("overdue", "overdue borrowings"),
+                    ("report", "reports"),
+                ],
+                default="report",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="summary",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="outboxmessage",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Buffered", "buffered"),
+                    ("Pending", "pending"),
+                    ("Sent", "sent"),
+                    ("Failed", "failed"),
+                    ("Merged", "merged"),
+                ],
+                default="Pending",
+                max_length=8,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="outboxmessage",
+            index=models.Index(
+                fields=["status", "event_type"], name="outbox_status_event_type_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tg_notifications", "0002_outbox_event_type_digest"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboxmessage",
+            name="delivered_chats",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"],
+                name="outbox_status_available_idx"
+            ),
+            models.Index(
+                fields=["status", "event_type"],
+                name="outbox_status_event_type_idx"
+            ),
+        ]
+
+    class Status(models.TextChoices):
+        # Waiting to be folded into a digest
+        BUFFERED = ("Buffered", "buffered")
+        PENDING = ("Pending", "pending")
+        SENT = ("Sent", "sent")
+        FAILED = ("Failed", "failed")
+        # Delivered as part of the `digest` message
+        MERGED = ("Merged", "merged")
+
+    class EventType(models.TextChoices):
+        BORROWING_CREATED = ("borrowing_created", "new borrowings")
+        BORROWING_RETURNED = ("borrowing_returned", "returned books")
+        PAYMENT_PAID = ("payment_paid", "paid payments")
+        OVERDUE = ("overdue", "overdue borrowings")
+        REPORT = ("report", "reports")
+
+    message = models.TextField()
+    event_type = models.CharField(
+        max_length=20,
+        choices=EventType.choices,
+        default=EventType.REPORT
+    )
+    # One line for the digest table
+    summary = models.CharField(max_length=255, blank=True)
+    digest = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="events"
+    )
+    status = models.CharField(
+        max_length=8,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    # Chats that already got the message, so a retry skips them
+    delivered_chats = models.JSONField(default=list, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Outbox message id: {self.id}, status: {self.status}"
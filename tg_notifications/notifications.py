@@ -1,18 +1,68 @@
-import os
-from dotenv import load_dotenv
-import requests
+import logging
+from typing import Optional
 
-load_dotenv()
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
 
-TG_TOKEN = os.environ.get("TG_TOKEN")
-CHAT_ID = os.environ.get("CHAT_ID")
+from library_service.metrics import NOTIFICATION_EVENTS
+from .bot import get_notifier
 
+logger = logging.getLogger(__name__)
 
-def send_message(message: str):
-    tg_api_url = f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage?chat_id={CHAT_ID}&text={message}"
-    tg_response = requests.get(tg_api_url)
 
-    if tg_response.status_code == 200:
-        print("INFO: The message has been sent")
-    else:
-        raise Exception(f"Error sending message: {message} ")
+def send_message(message: str, delivered: Optional[list] = None):
+    """
+    Deliver `message` through `settings.TELEGRAM_BACKEND`. Chats the
+    backend has sent it to are appended to `delivered`.
+    """
+    return import_string(settings.TELEGRAM_BACKEND)(message, delivered)
+
+
+def send_telegram_message(message: str, delivered: Optional[list] = None):
+    get_notifier().broadcast(message, delivered=delivered)
+    logger.info("The message has been sent")
+
+
+def queue_message(message: str, event_type: str = "report", summary: str = ""):
+    """
+    Store the message in the outbox as part of the current transaction.
+    It is sent by `dispatch_outbox` after commit, so a slow or failing
+    Telegram never delays or rolls back the caller.
+
+    Event types listed in `NOTIFICATION_DIGEST_WINDOWS` are buffered and
+    go out as one digest per window, with `summary` as their table row.
+    """
+    return queue_messages([message], event_type, [summary])[0]
+
+
+def queue_messages(
+        messages: list[str],
+        event_type: str = "report",
+        summaries: Optional[list[str]] = None,
+):
+    """Bulk version of `queue_message` that schedules a single dispatch."""
+    from .models import OutboxMessage
+    from .tasks import dispatch_outbox
+
+    status = (
+        OutboxMessage.Status.BUFFERED
+        if event_type in settings.NOTIFICATION_DIGEST_WINDOWS
+        else OutboxMessage.Status.PENDING
+    )
+    outbox_messages = OutboxMessage.objects.bulk_create(
+        OutboxMessage(
+            message=message,
+            event_type=event_type,
+            summary=summary[:255],
+            status=status,
+        )
+        for message, summary in zip(
+            messages, summaries or [""] * len(messages)
+        )
+    )
+    transaction.on_commit(
+        lambda: NOTIFICATION_EVENTS.labels(event_type).inc(len(messages))
+    )
+    transaction.on_commit(dispatch_outbox.delay, robust=True)
+    return outbox_messages
@@ -0,0 +1,181 @@
+from datetime import timedelta
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from library_service.metrics import NOTIFICATION_MESSAGES
+from .bot import redact
+from .models import OutboxMessage
+from .notifications import send_message
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_LEASE = timedelta(minutes=5)
+OUTBOX_RETRY_DELAY = timedelta(seconds=30)
+OUTBOX_PURGE_BATCH_SIZE = 1000
+# Telegram rejects messages over 4096 characters
+DIGEST_MAX_CHARS = 4000
+
+
+def render_digest(event_type: str, events: list, now) -> str:
+    """A header with the event count, then one summary line per event."""
+    if len(events) == 1:
+        return events[0].message
+    seconds = max(int((now - events[0].created_at).total_seconds()), 1)
+    lines = [
+        f"{len(events)} {OutboxMessage.EventType(event_type).label} "
+        f"in the last {seconds}s"
+    ]
+    size = len(lines[0])
+    for index, event in enumerate(events):
+        line = event.summary or event.message.splitlines()[0]
+        if size + len(line) + 1 > DIGEST_MAX_CHARS:
+            lines.append(f"... and {len(events) - index} more")
+            break
+        lines.append(line)
+        size += len(line) + 1
+    return "\n".join(lines)
+
+
+def coalesce(now=None) -> int:
+    """
+    Fold buffered events into one digest message per event type once the
+    oldest of them is past its window, or as soon as
+    `NOTIFICATION_DIGEST_MAX_EVENTS` are waiting. Returns the number of
+    digests queued.
+    """
+    now = now or timezone.now()
+    windows = settings.NOTIFICATION_DIGEST_WINDOWS
+    max_events = settings.NOTIFICATION_DIGEST_MAX_EVENTS
+    # Types no longer buffered are sent one by one again
+    OutboxMessage.objects.filter(
+        status=OutboxMessage.Status.BUFFERED
+    ).exclude(event_type__in=windows).update(
+        status=OutboxMessage.Status.PENDING
+    )
+
+    digests = 0
+    for event_type, window in windows.items():
+        full = True
+        while full:
+            with transaction.atomic():
+                events = list(
+                    OutboxMessage.objects.select_for_update(skip_locked=True)
+                    .filter(
+                        status=OutboxMessage.Status.BUFFERED,
+                        event_type=event_type,
+                    )
+                    .order_by("id")[:max_events]
+                )
+                full = len(events) == max_events
+                if not events or not full and (
+                        events[0].created_at > now - timedelta(seconds=window)
+                ):
+                    break
+                digest = OutboxMessage.objects.create(
+                    message=render_digest(event_type, events, now),
+                    event_type=event_type,
+                )
+                OutboxMessage.objects.filter(
+                    id__in=[event.id for event in events]
+                ).update(status=OutboxMessage.Status.MERGED, digest=digest)
+            digests += 1
+    return digests
+
+
+def claim_batch(batch_size: int = OUTBOX_BATCH_SIZE) -> list[OutboxMessage]:
+    """
+    Lease the oldest due messages so parallel dispatchers skip them.
+    A worker that dies mid-batch only delays its messages by OUTBOX_LEASE.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=OutboxMessage.Status.PENDING,
+                available_at__lte=now
+            )
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboxMessage.objects.filter(id__in=ids).update(
+            available_at=now + OUTBOX_LEASE
+        )
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by("id"))
+
+
+def deliver(message: OutboxMessage) -> bool:
+    try:
+        # A partly failed broadcast is retried on the remaining chats only
+        send_message(message.message, message.delivered_chats)
+    except Exception as error:
+        message.attempts += 1
+        # Readable in the admin, so no bot token may end up there
+        message.last_error = redact(str(error))
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxMessage.Status.FAILED
+        else:
+            delay = OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1)
+            # Telegram tells how long a rate-limited chat has to wait
+            retry_after = getattr(error, "retry_after", None)
+            if retry_after:
+                delay = max(delay, timedelta(seconds=retry_after))
+            message.available_at = timezone.now() + delay
+        return False
+
+    message.status = OutboxMessage.Status.SENT
+    message.sent_at = timezone.now()
+    NOTIFICATION_MESSAGES.labels(message.event_type).inc()
+    return True
+
+
+@shared_task()
+def dispatch_outbox():
+    digests = coalesce()
+    sent = failed = 0
+    while batch := claim_batch():
+        for message in batch:
+            if deliver(message):
+                sent += 1
+            else:
+                failed += 1
+        OutboxMessage.objects.bulk_update(
+            batch,
+            [
+                "status",
+                "delivered_chats",
+                "attempts",
+                "last_error",
+                "available_at",
+                "sent_at",
+            ],
+        )
+    return {"sent": sent, "failed": failed, "digests": digests}
+
+
+@shared_task()
+def purge_outbox(now=None) -> int:
+    """
+    Delete delivered messages older than `OUTBOX_RETENTION_DAYS`: sent
+    ones by their send time, merged events by their queue time. Failed
+    messages are kept. Rows go in batches, so no delete holds many locks.
+    """
+    cutoff = (now or timezone.now()) - timedelta(
+        days=settings.OUTBOX_RETENTION_DAYS
+    )
+    delivered = OutboxMessage.objects.filter(
+        Q(status=OutboxMessage.Status.SENT, sent_at__lt=cutoff)
+        | Q(status=OutboxMessage.Status.MERGED, created_at__lt=cutoff)
+    )
+    deleted = 0
+    while ids := list(
+            delivered.order_by("id").values_list("id", flat=True)[
+                :OUTBOX_PURGE_BATCH_SIZE
+            ]
+    ):
+        deleted += OutboxMessage.objects.filter(id__in=ids).delete()[0]
+    return deleted
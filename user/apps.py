@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class UserConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "user"
+
+    def ready(self):
+        from .authentication import invalidate_auth_state
+
+        user = self.get_model("User")
+        post_save.connect(invalidate_auth_state, sender=user)
+        post_delete.connect(invalidate_auth_state, sender=user)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from library_service.metrics import CACHE_REQUESTS
+
+AUTH_STATE_FIELDS = ("email", "is_active", "is_staff", "is_superuser")
+
+
+def auth_state_key(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def get_auth_state(user_id):
+    """
+    The fields authentication depends on, from the cache or, on a miss,
+    from the database. Returns None for unknown users.
+    """
+    key = auth_state_key(user_id)
+    state = cache.get(key)
+    if state is not None:
+        CACHE_REQUESTS.labels("auth", "hit").inc()
+        return state
+
+    CACHE_REQUESTS.labels("auth", "miss").inc()
+    state = (
+        get_user_model().objects.filter(id=user_id)
+        .values(*AUTH_STATE_FIELDS)
+        .first()
+    )
+    if state is not None:
+        cache.set(key, state, settings.AUTH_STATE_CACHE_TTL)
+    return state
+
+
+def invalidate_auth_state(instance, **kwargs) -> None:
+    """
+    Forget a user's cached state when the row changes, connected to User
+    signals. The delete after commit also drops a state another request
+    read from the old row meanwhile. Queryset `.update()` sends no
+    signal, so call this after such updates.
+    """
+    key = auth_state_key(instance.pk)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that does not load the user row per request.
+
+    The user is built from the token's id claim and the cached auth
+    state, so deactivation, a lost staff flag or a new email apply
+    before the token expires.
+    Only the claim fields are loaded on the returned `User`, any other
+    field is fetched from the database on first access.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            )
+
+        state = get_auth_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not state["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        values = {
+            **state,
+            "id": user_id,
+            "email": state["email"],
+        }
+        User = get_user_model()
+        # from_db() takes the loaded values in model field order
+        fields = [
+            field.attname for field in User._meta.concrete_fields
+            if field.attname in values
+        ]
+        return User.from_db(
+            router.db_for_read(User),
+            fields,
+            [values[field] for field in fields],
+        )
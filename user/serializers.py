@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.utils.translation import gettext as _
 
 
@@ -40,3 +41,17 @@ class UserRetrieveSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
         fields = ["email", "first_name", "last_name"]
+
+
+class TokenClaimsSerializer(TokenObtainPairSerializer):
+    """
+    Adds the user's email for API clients to show who is signed in.
+    The server never trusts it, ClaimsJWTAuthentication reads the email
+    and flags from the cached auth state.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        return token
@@ -1,3 +1,4 @@
+from django.contrib.auth import get_user_model
 from rest_framework import generics
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import UserSerializer, UserRetrieveSerializer
@@ -6,6 +7,7 @@ from .serializers import UserSerializer, UserRetrieveSerializer
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_scope = "register"
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
@@ -13,4 +15,5 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        # request.user only carries the auth state, updates need the row
+        return get_user_model().objects.get(pk=self.request.user.pk)